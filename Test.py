@@ -6,19 +6,55 @@ import pygame
 import tkinter as tk
 from PIL import Image, ImageTk
 import math
+import numpy as np
 import os
-from collections import deque
+from collections import deque, OrderedDict
+from array import array
 import json
-SCENE_SAVE_FILE = "scenes.json"
+import time
+import threading
+import queue
+import struct
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from functools import partial
+import sys
+from netview import PlayerViewServer, FrameStreamServer, RESET, SCENE, SEGMENT, SEGMENT_TILES, TOKEN, TOKEN_REMOVE, EXPLORED, \
+    SEGMENT_REMOVE, TILE_WALKABLE, TILE_EDGES
+SCENE_SAVE_FILE = "scenes.json"        # legacy format, imported once
+CAMPAIGN_FILE = "campaign.vtt"
+CAMPAIGN_MAGIC = b"VTTCAMPAIGN1\n"
+MOVE_TILES_PER_TICK = 4   # tiles a token advances each update tick
+MOVE_SPEED = None         # tiles per second; overrides MOVE_TILES_PER_TICK when set
+SEGMENT_CACHE_TILES = 50000   # parsed segment tiles kept in memory
+SEGMENT_FOLDER = "segments"
+SEGMENT_POLL_INTERVAL = 0.5   # seconds between checks for edited PNGs
+ZOOM_LEVELS = (2.0, 1.0, 0.5, 0.25, 0.125)   # each level halves the one before
+WORLD_CHUNK = 32          # tiles per world chunk side (segment grid, explored memory, render caches)
+CHUNK_LAYER_BUDGET = 128 * 1024 * 1024    # bytes of rendered map chunks kept across all zoom levels
+EXPLORED_ZOOM_BUDGET = 32 * 1024 * 1024   # bytes of explored-memory copies at non-base zoom levels
+SERVE_PLAYER_VIEW = "--serve" in sys.argv   # stream the player view to remote clients
+PLAYER_VIEW_HOST = "0.0.0.0"
+PLAYER_VIEW_PORT = 8765
+STREAM_PLAYER_FRAMES = "--stream" in sys.argv   # serve the rendered player view to browsers
+PLAYER_STREAM_PORT = 8766
+SESSION_FOLDER = "sessions"
+SESSION_SNAPSHOT_INTERVAL = 60.0   # seconds between full world snapshots in the session log
+SESSION_EXPLORED_INTERVAL = 1.0    # seconds between logging newly explored chunks
+SIGHT_CACHE_SIZE = 20000   # memoized line-of-sight results
+LIGHT_DARK, LIGHT_DIM, LIGHT_BRIGHT = 0, 1, 2
+TORCH_RADII = (4, 8)        # bright, dim radius in tiles
+AOE_SIZES = {"sphere": 4, "cone": 6, "line": 12, "cube": 3}   # tiles (5 ft each) for the DM tool
+FIT_PLAYER_FOCUS = False   # zoom the player view out so the whole focus group fits
 current_scene="VAULT"
-selected_char_index = 0
+selected_token_id = None
 current_turn_char = None
 segment_manager_mode = False
 dragged_segment = None
+aoe_shape = None          # DM area tool: None or a key of AOE_SIZES
+aoe_preview = None        # AreaTemplate being shown on the DM view
 seg_drag_offset = (0, 0)
 combat_active = False
-initiative_order = []
-current_initiative_index = 0
 
 # ------------------------------
 # Tile and Map / MultiMap
@@ -40,58 +76,449 @@ class SingleMap:
     def in_bounds(self, x, y):
         return 0 <= x < self.width and 0 <= y < self.height
 
+class SegmentCache:
+    """LRU of parsed segment grids, capped by tile count; active segments are never evicted."""
+
+    def __init__(self, max_tiles=SEGMENT_CACHE_TILES):
+        self.max_tiles = max_tiles
+        self.grids = OrderedDict()   # seg -> SingleMap, oldest first
+        self.filenames = set()       # files of the cached segments, read by the watcher thread
+        self.tiles = 0
+
+    def get(self, seg):
+        grid = self.grids.get(seg)
+        if grid is not None:
+            self.grids.move_to_end(seg)
+            return grid
+
+        grid = loadfrompng(seg.filename, seg.tilewidth, seg.tileheight)
+        self.put(seg, grid)
+        return grid
+
+    def put(self, seg, grid):
+        self.discard(seg)
+        self.grids[seg] = grid
+        self.filenames.add(seg.filename)
+        self.tiles += grid.width * grid.height
+        self.evict(keep=seg)
+
+    def evict(self, keep=None):
+        # Always keep the grid just loaded, even if it alone is over the cap
+        for seg in list(self.grids):
+            if self.tiles <= self.max_tiles:
+                return
+            if seg is not keep and not getattr(seg, "active", True):
+                self.discard(seg)
+
+    def discard(self, seg):
+        grid = self.grids.pop(seg, None)
+        if grid is not None:
+            self.filenames.discard(seg.filename)
+            self.tiles -= grid.width * grid.height
+
+
+def png_tile_size(filename, tilewidth, tileheight):
+    # Only the PNG header is read here; tiles are parsed on first use
+    with Image.open(filename) as im:
+        px_width, px_height = im.size
+    return px_width // tilewidth, px_height // tileheight
+
+
 class MapSegment:
     def __init__(self, filename, tilewidth, tileheight, offset_x=0, offset_y=0, name=None):
         self.filename = filename
         self.name = name or filename.split("\\")[-1]
         self.offset_x = offset_x
         self.offset_y = offset_y
-        self.map = loadfrompng(filename, tilewidth, tileheight)
-        self.width = self.map.width
-        self.height = self.map.height
+        self.tilewidth = tilewidth
+        self.tileheight = tileheight
+        self.width, self.height = png_tile_size(filename, tilewidth, tileheight)
         self.active = True
+        self.version = 0   # bumped when the PNG is reloaded
+
+    @property
+    def map(self):
+        return segment_cache.get(self)
+
+
+segment_cache = SegmentCache()
+
+class SegmentEdgeIndex:
+    """Borders of active segments kept sorted by coordinate for snapping.
+
+    Vertical borders (W/E) are keyed by x and carry their y span,
+    horizontal borders (N/S) by y with their x span.
+    """
+
+    def __init__(self):
+        self.vertical = ([], [])     # sorted x, entries (x, y0, y1, seg)
+        self.horizontal = ([], [])   # sorted y, entries (y, x0, x1, seg)
+        self.indexed = {}            # seg -> (vertical entries, horizontal entries)
+
+    @staticmethod
+    def insert(axis, entry):
+        keys, entries = axis
+        i = bisect_right(keys, entry[0])
+        keys.insert(i, entry[0])
+        entries.insert(i, entry)
+
+    @staticmethod
+    def delete(axis, entry):
+        keys, entries = axis
+        i = bisect_left(keys, entry[0])
+        while entries[i] is not entry:
+            i += 1
+        del keys[i]
+        del entries[i]
+
+    def add(self, seg):
+        if not getattr(seg, "active", True):
+            return
+        x0, x1 = seg.offset_x, seg.offset_x + seg.width
+        y0, y1 = seg.offset_y, seg.offset_y + seg.height
+        vertical = [(x0, y0, y1, seg), (x1, y0, y1, seg)]
+        horizontal = [(y0, x0, x1, seg), (y1, x0, x1, seg)]
+        for entry in vertical:
+            self.insert(self.vertical, entry)
+        for entry in horizontal:
+            self.insert(self.horizontal, entry)
+        self.indexed[seg] = (vertical, horizontal)
+
+    def remove(self, seg):
+        edges = self.indexed.pop(seg, None)
+        if edges is None:
+            return
+        for entry in edges[0]:
+            self.delete(self.vertical, entry)
+        for entry in edges[1]:
+            self.delete(self.horizontal, entry)
+
+    def update(self, seg):
+        self.remove(seg)
+        self.add(seg)
+
+    @staticmethod
+    def near(axis, coord, distance):
+        keys, entries = axis
+        return entries[bisect_left(keys, coord - distance):bisect_right(keys, coord + distance)]
+
+    def near_vertical(self, x, distance):
+        return self.near(self.vertical, x, distance)
+
+    def near_horizontal(self, y, distance):
+        return self.near(self.horizontal, y, distance)
+
+
+SEGMENT_GRID_CELL = WORLD_CHUNK   # grid cells are the world chunks
+
+class SegmentGrid:
+    """Uniform grid over segment rectangles for point / rect / overlap queries.
+
+    Every segment (active or not) is bucketed into the cells its rectangle
+    covers; cell lists stay in segment list order so overlapping segments
+    resolve the same way they always have.
+    """
+
+    def __init__(self, cell=SEGMENT_GRID_CELL):
+        self.cell = cell
+        self.cells = {}        # (cx, cy) -> segments, in list order
+        self.cells_of = {}     # seg -> cell keys it is bucketed in
+        self.order = {}        # seg -> position in MultiMap.segments
+        self.overlap_cache = None
+        self.cell_versions = {}   # (cx, cy) -> bumped whenever a segment enters/leaves the cell
+        self.version_counter = 0
+
+    def touch(self, key):
+        self.version_counter += 1
+        self.cell_versions[key] = self.version_counter
+
+    def cell_keys(self, x0, y0, x1, y1):
+        # Cells covering tiles x0..x1-1, y0..y1-1
+        c = self.cell
+        return [(cx, cy)
+                for cy in range(y0 // c, (y1 - 1) // c + 1)
+                for cx in range(x0 // c, (x1 - 1) // c + 1)]
+
+    def add(self, seg):
+        self.order.setdefault(seg, len(self.order))
+        keys = self.cell_keys(seg.offset_x, seg.offset_y,
+                              seg.offset_x + seg.width, seg.offset_y + seg.height)
+        for key in keys:
+            bucket = self.cells.setdefault(key, [])
+            bucket.append(seg)
+            bucket.sort(key=self.order.__getitem__)
+            self.touch(key)
+        self.cells_of[seg] = keys
+        self.overlap_cache = None
+
+    def remove(self, seg):
+        for key in self.cells_of.pop(seg, ()):
+            bucket = self.cells[key]
+            bucket.remove(seg)
+            if not bucket:
+                del self.cells[key]
+            self.touch(key)
+        self.overlap_cache = None
+
+    def update(self, seg):
+        self.remove(seg)
+        self.add(seg)
+
+    def segment_at(self, x, y, active_only=True):
+        for seg in self.cells.get((x // self.cell, y // self.cell), ()):
+            if active_only and not getattr(seg, "active", True):
+                continue
+            if (seg.offset_x <= x < seg.offset_x + seg.width and
+                seg.offset_y <= y < seg.offset_y + seg.height):
+                return seg
+        return None
+
+    def segments_in_rect(self, x0, y0, x1, y1, active_only=True):
+        """Segments intersecting tiles x0..x1-1, y0..y1-1, in list order."""
+        found = set()
+        for key in self.cell_keys(x0, y0, x1, y1):
+            for seg in self.cells.get(key, ()):
+                if active_only and not getattr(seg, "active", True):
+                    continue
+                if (seg.offset_x < x1 and x0 < seg.offset_x + seg.width and
+                    seg.offset_y < y1 and y0 < seg.offset_y + seg.height):
+                    found.add(seg)
+        return sorted(found, key=self.order.__getitem__)
+
+    def overlaps(self):
+        """[(seg_a, seg_b, (x, y, w, h))] for every pair of active segments that overlap."""
+        if self.overlap_cache is not None:
+            return self.overlap_cache
+
+        seen = set()
+        result = []
+        for bucket in self.cells.values():
+            active = [seg for seg in bucket if getattr(seg, "active", True)]
+            for i, a in enumerate(active):
+                for b in active[i + 1:]:
+                    if (a, b) in seen:
+                        continue
+                    seen.add((a, b))
+                    x0 = max(a.offset_x, b.offset_x)
+                    y0 = max(a.offset_y, b.offset_y)
+                    x1 = min(a.offset_x + a.width, b.offset_x + b.width)
+                    y1 = min(a.offset_y + a.height, b.offset_y + b.height)
+                    if x0 < x1 and y0 < y1:
+                        result.append((a, b, (x0, y0, x1 - x0, y1 - y0)))
+
+        self.overlap_cache = result
+        return result
+
+
+class Door:
+    """A door or movable wall on one tile edge, stored as the east or south edge of a tile."""
+
+    def __init__(self, x, y, side, is_open=False):
+        if side == "W":
+            x, side = x - 1, "E"
+        elif side == "N":
+            y, side = y - 1, "S"
+        self.x = x
+        self.y = y
+        self.side = side
+        self.is_open = is_open
+
+    @property
+    def edge(self):
+        return (self.x, self.y, self.side)
+
+    def tiles(self):
+        if self.side == "E":
+            return (self.x, self.y), (self.x + 1, self.y)
+        return (self.x, self.y), (self.x, self.y + 1)
+
+
+class DoorLayer:
+    """Doors laid over the wall edges baked in from the PNGs.
+
+    A closed door blocks its edge like a wall. Opening or closing one
+    bumps the segment-grid version of only the chunks either side of it,
+    which is what line of sight, lights and the chunk render cache check,
+    so a toggle costs what the door can affect, not the whole map.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.doors = {}      # edge -> Door
+        self.closed = set()  # edges of closed doors
+        self.by_chunk = {}   # (cx, cy) -> doors touching that chunk
+
+    def chunks_of(self, door):
+        return {(x // WORLD_CHUNK, y // WORLD_CHUNK) for x, y in door.tiles()}
+
+    def touch(self, door):
+        for key in self.chunks_of(door):
+            self.grid.touch(key)
+
+    def add(self, door):
+        old = self.doors.get(door.edge)
+        if old is not None:
+            self.remove(old)
+        self.doors[door.edge] = door
+        if not door.is_open:
+            self.closed.add(door.edge)
+        for key in self.chunks_of(door):
+            self.by_chunk.setdefault(key, []).append(door)
+        self.touch(door)
+        return door
+
+    def remove(self, door):
+        if self.doors.get(door.edge) is not door:
+            return
+        del self.doors[door.edge]
+        self.closed.discard(door.edge)
+        for key in self.chunks_of(door):
+            bucket = self.by_chunk[key]
+            bucket.remove(door)
+            if not bucket:
+                del self.by_chunk[key]
+        self.touch(door)
+
+    def clear(self):
+        for door in list(self.doors.values()):
+            self.remove(door)
+
+    def at(self, x, y, side):
+        return self.doors.get(Door(x, y, side).edge)
+
+    def set_open(self, door, is_open):
+        if door.is_open == is_open:
+            return
+        door.is_open = is_open
+        if is_open:
+            self.closed.discard(door.edge)
+        else:
+            self.closed.add(door.edge)
+        self.touch(door)
+
+    def toggle(self, door):
+        self.set_open(door, not door.is_open)
+
+    def in_chunk(self, key):
+        return self.by_chunk.get(key, ())
+
+    def edge_closed(self, x1, y1, x2, y2):
+        # Orthogonal neighbours only
+        if x2 == x1 + 1:
+            return (x1, y1, "E") in self.closed
+        if x2 == x1 - 1:
+            return (x2, y2, "E") in self.closed
+        if y2 == y1 + 1:
+            return (x1, y1, "S") in self.closed
+        return (x2, y2, "S") in self.closed
+
+    def blocks(self, x1, y1, x2, y2):
+        """True if a closed door is in the way of a one-tile step."""
+        if not self.closed or (x1 == x2 and y1 == y2):
+            return False
+        if x1 == x2 or y1 == y2:
+            return self.edge_closed(x1, y1, x2, y2)
+        # Diagonal: blocked only if both ways around the corner are
+        return ((self.edge_closed(x1, y1, x2, y1) or self.edge_closed(x2, y1, x2, y2)) and
+                (self.edge_closed(x1, y1, x1, y2) or self.edge_closed(x1, y2, x2, y2)))
+
 
 class MultiMap:
     def __init__(self):
         self.segments = []
+        self.by_filename = {}
+        self.edge_index = SegmentEdgeIndex()
+        self.segment_grid = SegmentGrid()
+        self.doors = DoorLayer(self.segment_grid)
+        self.seg_rects = {}          # seg -> (x0, y0, x1, y1) while active
+        self.bounds = (0, 0, 0, 0)   # min_x, min_y, max_x, max_y of active segments
 
     def add_segment(self, segment):
         self.segments.append(segment)
+        self.by_filename[segment.filename] = segment
+        self.edge_index.add(segment)
+        self.segment_grid.add(segment)
+        self.update_bounds(segment)
+
+    def segment_changed(self, segment):
+        # Call after moving or toggling a segment
+        self.edge_index.update(segment)
+        self.segment_grid.update(segment)
+        self.update_bounds(segment)
+
+    def update_bounds(self, segment):
+        old = self.seg_rects.pop(segment, None)
+        if getattr(segment, "active", True):
+            new = (segment.offset_x, segment.offset_y,
+                   segment.offset_x + segment.width, segment.offset_y + segment.height)
+            self.seg_rects[segment] = new
+        else:
+            new = None
+
+        bounds = self.bounds
+        if old is not None and (old[0] == bounds[0] or old[1] == bounds[1] or
+                                old[2] == bounds[2] or old[3] == bounds[3]):
+            # The segment may have been holding a bound – rescan active rects
+            rects = self.seg_rects.values()
+            bounds = (min((r[0] for r in rects), default=0), min((r[1] for r in rects), default=0),
+                      max((r[2] for r in rects), default=0), max((r[3] for r in rects), default=0))
+        elif new is not None:
+            if len(self.seg_rects) == 1:
+                bounds = new
+            else:
+                bounds = (min(bounds[0], new[0]), min(bounds[1], new[1]),
+                          max(bounds[2], new[2]), max(bounds[3], new[3]))
+
+        self.bounds = bounds
+
+    def segment_at(self, x, y, active_only=True):
+        return self.segment_grid.segment_at(x, y, active_only)
 
     @property
     def width(self):
-        return max((seg.offset_x + seg.width for seg in self.segments if getattr(seg, "active", True)), default=0)
+        return self.bounds[2] - self.bounds[0]
 
     @property
     def height(self):
-        return max((seg.offset_y + seg.height for seg in self.segments if getattr(seg, "active", True)), default=0)
+        return self.bounds[3] - self.bounds[1]
 
     def get_tile(self, x, y):
-        for seg in self.segments:
-            if not getattr(seg, "active", True):
-                continue
-            lx, ly = x - seg.offset_x, y - seg.offset_y
-            if 0 <= lx < seg.width and 0 <= ly < seg.height:
-                return seg.map.get_tile(lx, ly)
-        return None
+        seg = self.segment_grid.segment_at(x, y)
+        if seg is None:
+            return None
+        return seg.map.get_tile(x - seg.offset_x, y - seg.offset_y)
 
     def in_bounds(self, x, y):
         return self.get_tile(x, y) is not None
 
 
     def can_move(self, x1, y1, x2, y2):
-        tile_from = self.get_tile(x1, y1)
-        tile_to = self.get_tile(x2, y2)
-
+        return (self.step_allowed(self.get_tile(x1, y1), self.get_tile(x2, y2), x2 - x1, y2 - y1)
+                and not self.doors.blocks(x1, y1, x2, y2))
+
+    def can_move_many(self, moves):
+        """can_move for a batch of (x1, y1, x2, y2); shared tiles are looked up once."""
+        tiles = {}
+
+        def lookup(x, y):
+            key = (x, y)
+            if key not in tiles:
+                tiles[key] = self.get_tile(x, y)
+            return tiles[key]
+
+        doors = self.doors
+        return [self.step_allowed(lookup(x1, y1), lookup(x2, y2), x2 - x1, y2 - y1)
+                and not doors.blocks(x1, y1, x2, y2)
+                for x1, y1, x2, y2 in moves]
+
+    @staticmethod
+    def step_allowed(tile_from, tile_to, dx, dy):
         if not tile_to or not tile_from:
             return False
 
         if not tile_to.walkable:
             return False
 
-        dx = x2 - x1
-        dy = y2 - y1
-
         # Determine direction
         if dx == 1 and dy == 0:  # moving east
             if tile_from.blocked_edges["E"] or tile_to.blocked_edges["W"]:
@@ -108,6 +535,34 @@ class MultiMap:
 
         return True
 
+    def sight_blocked(self, prev_tx, prev_ty, prev_tile, tx, ty, tile):
+        """True if sight cannot pass from one tile into the next (fog and line of sight share this)."""
+        dx = tx - prev_tx
+        dy = ty - prev_ty
+        edges = tile.blocked_edges
+        prev_edges = prev_tile.blocked_edges
+
+        if self.doors.closed and self.doors.blocks(prev_tx, prev_ty, tx, ty):
+            return True
+
+        # Horizontal / vertical edge check
+        if dx == 1 and (edges["W"] is True or prev_edges["E"] is True):
+            return True
+        if dx == -1 and (edges["E"] is True or prev_edges["W"] is True):
+            return True
+        if dy == 1 and (edges["N"] is True or prev_edges["S"] is True):
+            return True
+        if dy == -1 and (edges["S"] is True or prev_edges["N"] is True):
+            return True
+
+        # Corner blocking: if moving diagonally, stop if either adjacent orthogonal tile blocks the corner
+        if dx != 0 and dy != 0:
+            neighbor_x = self.get_tile(prev_tx + dx, prev_ty)
+            neighbor_y = self.get_tile(prev_tx, prev_ty + dy)
+            if (neighbor_x and not neighbor_x.walkable) or (neighbor_y and not neighbor_y.walkable):
+                return True
+        return False
+
 
 # ------------------------------
 # Camera (works with SingleMap + MultiMap)
@@ -119,6 +574,9 @@ class Camera:
         self.width = width
         self.height = height
         self.world = world   # this is the World object
+        self.view_width = width     # tiles on screen at zoom 1
+        self.view_height = height
+        self.zoom = 1.0
 
         self.dragging = False
         self.drag_start = (0, 0)
@@ -131,17 +589,56 @@ class Camera:
         return sx + self.x, sy + self.y
 
     def clamp(self):
-        max_x = max(0, self.world.map.width - self.width)
-        max_y = max(0, self.world.map.height - self.height)
+        min_x, min_y, max_x, max_y = self.world.map.bounds
+        max_x = max(min_x, max_x - self.width)
+        max_y = max(min_y, max_y - self.height)
 
-        self.x = max(0, min(self.x, max_x))
-        self.y = max(0, min(self.y, max_y))
+        self.x = max(min_x, min(self.x, max_x))
+        self.y = max(min_y, min(self.y, max_y))
 
     def center_on(self, wx, wy):
         self.x = int(wx - self.width // 2)
         self.y = int(wy - self.height // 2)
         self.clamp()
 
+    def fit(self, x0, y0, x1, y1, margin=2):
+        """Centre on a tile box, zooming out until it fits (never in past 1.0).
+
+        Returns True if the zoom changed.
+        """
+        need_w = x1 - x0 + 1 + 2 * margin
+        need_h = y1 - y0 + 1 + 2 * margin
+        zoom = ZOOM_LEVELS[-1]
+        for level in ZOOM_LEVELS:
+            if level <= 1.0 and (self.view_width * BASE_TILE // max(1, int(BASE_TILE * level)) >= need_w and
+                                 self.view_height * BASE_TILE // max(1, int(BASE_TILE * level)) >= need_h):
+                zoom = level
+                break
+        changed = zoom != self.zoom
+        if changed:
+            self.set_zoom(zoom)
+        self.center_on((x0 + x1) // 2, (y0 + y1) // 2)
+        return changed
+
+    @property
+    def tile_px(self):
+        return max(1, int(BASE_TILE * self.zoom))
+
+    def set_zoom(self, zoom):
+        # Keep the same world point in the middle of the view
+        cx = self.x + self.width // 2
+        cy = self.y + self.height // 2
+        self.zoom = zoom
+        self.width = self.view_width * BASE_TILE // self.tile_px
+        self.height = self.view_height * BASE_TILE // self.tile_px
+        self.center_on(cx, cy)
+
+    def zoom_step(self, steps):
+        # steps > 0 zooms in, < 0 zooms out, along ZOOM_LEVELS
+        i = ZOOM_LEVELS.index(self.zoom) if self.zoom in ZOOM_LEVELS else ZOOM_LEVELS.index(1.0)
+        i = max(0, min(len(ZOOM_LEVELS) - 1, i - steps))
+        self.set_zoom(ZOOM_LEVELS[i])
+
 
 
 
@@ -157,14 +654,8 @@ class Character:
         self.max_hp = hp
         self.abl = {"str": str_score, "dex": dex, "con": con,
                     "int": int_score, "wis": wis, "cha": cha}
-        self.move_queue = []
-
-    def update_position(self, world):
-        if self.move_queue:
-            dx, dy = self.move_queue.pop(0)
-            nx, ny = self.x + dx, self.y + dy
-            if world.map.can_move(self.x, self.y, nx, ny):
-                self.x, self.y = nx, ny
+        self.move_queue = deque()
+        self.token_id = None     # assigned by World.add_characters
 
 
 class PlayerCharacter(Character):
@@ -175,11 +666,167 @@ class PlayerCharacter(Character):
         self.initiative = 0
         self.vision_radius=30
         self.vision_type=""
+        self.darkvision = 0   # tiles a PC can see without light
 
     def set_initiative(self, roll):
         self.initiative_roll = roll
         self.initiative = roll + self.initiative_mod
 
+
+# ------------------------------
+# Compact characters (big battles)
+# ------------------------------
+ABILITY_KEYS = ("str", "dex", "con", "int", "wis", "cha")
+
+class CompactStore:
+    """Struct-of-arrays storage for large NPC populations.
+
+    Every token is one row across parallel arrays; CompactCharacter is a
+    slotted handle onto a row so the rest of the code can treat it like a
+    normal Character.
+    """
+
+    def __init__(self):
+        self.x = array("i")
+        self.y = array("i")
+        self.hp = array("i")
+        self.max_hp = array("i")
+        self.abl = {key: array("b") for key in ABILITY_KEYS}
+        self.kind = array("H")
+        self.kind_names = []
+        self.kind_codes = {}
+        self.chars = []          # row -> CompactCharacter
+        self.move_queues = {}    # only tokens that have a queued path
+
+    def __len__(self):
+        return len(self.chars)
+
+    def kind_code(self, kind):
+        code = self.kind_codes.get(kind)
+        if code is None:
+            code = len(self.kind_names)
+            self.kind_names.append(kind)
+            self.kind_codes[kind] = code
+        return code
+
+    def add(self, x, y, hp, str_score, dex, con, int_score, wis, cha, name, kind="npc"):
+        char = CompactCharacter(self, len(self.chars), name)
+        self.x.append(x)
+        self.y.append(y)
+        self.hp.append(hp)
+        self.max_hp.append(hp)
+        for key, score in zip(ABILITY_KEYS, (str_score, dex, con, int_score, wis, cha)):
+            self.abl[key].append(score)
+        self.kind.append(self.kind_code(kind))
+        self.chars.append(char)
+        return char
+
+    def remove(self, char):
+        # Swap the last row into the hole so the arrays stay dense
+        row = char.slot
+        last = len(self.chars) - 1
+        columns = [self.x, self.y, self.hp, self.max_hp, self.kind] + list(self.abl.values())
+        if row != last:
+            for col in columns:
+                col[row] = col[last]
+            moved = self.chars[last]
+            moved.slot = row
+            self.chars[row] = moved
+        for col in columns:
+            col.pop()
+        self.chars.pop()
+        self.move_queues.pop(char, None)
+        char.store = None
+
+    def of_kind(self, kind):
+        code = self.kind_codes.get(kind)
+        if code is None:
+            return []
+        chars = self.chars
+        return [chars[row] for row, k in enumerate(self.kind) if k == code]
+
+    def change_hp(self, chars, delta):
+        hp, max_hp = self.hp, self.max_hp
+        rows = range(len(self.chars)) if chars is None else [c.slot for c in chars]
+        for row in rows:
+            hp[row] = max(0, min(max_hp[row], hp[row] + delta))
+
+
+class CompactAbilities:
+    __slots__ = ("char",)
+
+    def __init__(self, char):
+        self.char = char
+
+    def __getitem__(self, key):
+        return self.char.store.abl[key][self.char.slot]
+
+    def __setitem__(self, key, value):
+        self.char.store.abl[key][self.char.slot] = value
+
+
+class CompactCharacter:
+    __slots__ = ("store", "slot", "name", "token_id")
+
+    def __init__(self, store, slot, name):
+        self.store = store
+        self.slot = slot
+        self.name = name
+        self.token_id = None
+
+    @property
+    def x(self):
+        return self.store.x[self.slot]
+
+    @x.setter
+    def x(self, value):
+        self.store.x[self.slot] = value
+
+    @property
+    def y(self):
+        return self.store.y[self.slot]
+
+    @y.setter
+    def y(self, value):
+        self.store.y[self.slot] = value
+
+    @property
+    def hp(self):
+        return self.store.hp[self.slot]
+
+    @hp.setter
+    def hp(self, value):
+        self.store.hp[self.slot] = value
+
+    @property
+    def max_hp(self):
+        return self.store.max_hp[self.slot]
+
+    @property
+    def kind(self):
+        return self.store.kind_names[self.store.kind[self.slot]]
+
+    @property
+    def abl(self):
+        return CompactAbilities(self)
+
+    @property
+    def initiative_mod(self):
+        return (self.store.abl["dex"][self.slot] - 10) // 2
+
+    @property
+    def move_queue(self):
+        # Read-only when idle; assign through the setter (World.queue_move) to start a path
+        return self.store.move_queues.get(self, ())
+
+    @move_queue.setter
+    def move_queue(self, steps):
+        # Assign a whole path; only non-empty queues are tracked
+        if steps:
+            self.store.move_queues[self] = deque(steps)
+        else:
+            self.store.move_queues.pop(self, None)
+
 # ------------------------------
 # Map loading from PNG
 # ------------------------------
@@ -235,243 +882,1328 @@ def loadfrompng(filename, tilewidth, tileheight):
 
     return game_map
 
+# ------------------------------
+# Token spatial index
+# ------------------------------
+class TokenGroup:
+    """Position totals for a set of tokens, kept current by TokenIndex.
+
+    Sums give the centroid and sorted coordinate lists give the bounding
+    box, so neither needs a pass over the members when asked for.
+    """
+
+    def __init__(self):
+        self.members = {}   # character -> None, in join order
+        self.sum_x = 0
+        self.sum_y = 0
+        self.xs = []        # member x coordinates, sorted
+        self.ys = []
+
+    def __len__(self):
+        return len(self.xs)
+
+    def add_position(self, x, y):
+        self.sum_x += x
+        self.sum_y += y
+        insort(self.xs, x)
+        insort(self.ys, y)
+
+    def remove_position(self, x, y):
+        self.sum_x -= x
+        self.sum_y -= y
+        del self.xs[bisect_left(self.xs, x)]
+        del self.ys[bisect_left(self.ys, y)]
+
+    def centroid(self):
+        if not self.xs:
+            return None
+        return self.sum_x // len(self.xs), self.sum_y // len(self.ys)
+
+    def bbox(self):
+        if not self.xs:
+            return None
+        return self.xs[0], self.ys[0], self.xs[-1], self.ys[-1]
+
+
+class TokenIndex:
+    """Per-tile buckets of characters so 'who is here' never scans every token."""
+
+    def __init__(self):
+        self.buckets = {}      # (x, y) -> list of characters on that tile
+        self.positions = {}    # character -> (x, y) it is bucketed under
+        self.groups_of = {}    # character -> TokenGroups it belongs to
+
+    def add(self, char):
+        pos = (char.x, char.y)
+        self.positions[char] = pos
+        self.buckets.setdefault(pos, []).append(char)
+        for group in self.groups_of.get(char, ()):
+            group.add_position(*pos)
+
+    def remove(self, char):
+        pos = self.positions.pop(char, None)
+        if pos is None:
+            return
+        bucket = self.buckets[pos]
+        bucket.remove(char)
+        if not bucket:
+            del self.buckets[pos]
+        for group in self.groups_of.get(char, ()):
+            group.remove_position(*pos)
+
+    def join(self, group, char):
+        if char in group.members:
+            return
+        group.members[char] = None
+        self.groups_of.setdefault(char, []).append(group)
+        if char in self.positions:
+            group.add_position(*self.positions[char])
+
+    def leave(self, group, char):
+        if char not in group.members:
+            return
+        del group.members[char]
+        groups = self.groups_of[char]
+        groups.remove(group)
+        if not groups:
+            del self.groups_of[char]
+        if char in self.positions:
+            group.remove_position(*self.positions[char])
+
+    def move(self, char):
+        # Call after changing char.x / char.y
+        if self.positions.get(char) == (char.x, char.y):
+            return
+        self.remove(char)
+        self.add(char)
+
+    def at(self, x, y):
+        return list(self.buckets.get((x, y), ()))
+
+    def in_rect(self, x0, y0, x1, y1):
+        """All characters with x0 <= x <= x1 and y0 <= y <= y1."""
+        if x0 > x1:
+            x0, x1 = x1, x0
+        if y0 > y1:
+            y0, y1 = y1, y0
+
+        found = []
+        # Small rects: probe tiles directly. Large rects: walk occupied buckets.
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self.buckets):
+            for y in range(y0, y1 + 1):
+                for x in range(x0, x1 + 1):
+                    found.extend(self.buckets.get((x, y), ()))
+        else:
+            for (x, y), bucket in self.buckets.items():
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    found.extend(bucket)
+        return found
+
+    def in_radius(self, x, y, radius):
+        """All characters whose tile centre is within radius tiles of (x, y)."""
+        r = int(math.ceil(radius))
+        r2 = radius * radius
+        return [c for c in self.in_rect(x - r, y - r, x + r, y + r)
+                if (c.x - x) ** 2 + (c.y - y) ** 2 <= r2]
+
+
+# ------------------------------
+# Explored memory (tile resolution)
+# ------------------------------
+EXPLORED_CHUNK = WORLD_CHUNK   # tiles per chunk side
+
+class SightCache:
+    """Memoized tile-to-tile line of sight.
+
+    A result is stored with the world chunks its line walked through and
+    the newest segment-grid version among them, so it stays valid until
+    something in those chunks changes rather than anywhere on the map.
+    """
+
+    def __init__(self, game_map, size=SIGHT_CACHE_SIZE):
+        self.map = game_map
+        self.size = size
+        self.results = OrderedDict()   # (x0, y0, x1, y1, through_solid) -> (chunks, stamp, visible)
+        self.chunk_sets = {}           # interned frozensets, so results share their chunk keys
+
+    def stamp(self, chunks):
+        versions = self.map.segment_grid.cell_versions
+        return max(versions.get(key, 0) for key in chunks)
+
+    def line(self, x0, y0, x1, y1, through_solid=False):
+        key = (x0, y0, x1, y1, through_solid)
+        cached = self.results.get(key)
+        if cached is not None:
+            chunks, stamp, visible = cached
+            if self.stamp(chunks) == stamp:
+                self.results.move_to_end(key)
+                return visible
+
+        visible, chunks = self.walk(x0, y0, x1, y1, through_solid)
+        chunks = frozenset(chunks)
+        chunks = self.chunk_sets.setdefault(chunks, chunks)
+        self.results[key] = (chunks, self.stamp(chunks), visible)
+        self.results.move_to_end(key)
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+        return visible
+
+    def walk(self, x0, y0, x1, y1, through_solid):
+        """Bresenham from tile to tile under the fog's rules: a tile is seen if
+        the line reaches it; solid tiles are seen but stop the line."""
+        game_map = self.map
+        chunks = set()
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        err = dx + dy
+        x, y = x0, y0
+        prev = None
+        while True:
+            chunks.add((x // WORLD_CHUNK, y // WORLD_CHUNK))
+            tile = game_map.get_tile(x, y)
+            if tile is None:
+                return False, chunks
+            if prev is not None:
+                px, py, prev_tile = prev
+                if px != x and py != y:
+                    # Corner tiles are looked at too
+                    chunks.add((x // WORLD_CHUNK, py // WORLD_CHUNK))
+                    chunks.add((px // WORLD_CHUNK, y // WORLD_CHUNK))
+                if game_map.sight_blocked(px, py, prev_tile, x, y, tile):
+                    return False, chunks
+            if x == x1 and y == y1:
+                return True, chunks
+            if not tile.walkable and not through_solid:
+                return False, chunks
+
+            prev = (x, y, tile)
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x += sx
+            if e2 <= dx:
+                err += dx
+                y += sy
+
+
+class LightSource:
+    def __init__(self, x, y, bright, dim=None, carrier=None):
+        self.x = x
+        self.y = y
+        self.bright = bright        # radius of bright light, tiles
+        self.dim = max(bright, dim or bright)   # dim light reaches this far
+        self.carrier = carrier      # token id the light moves with, or None
+
+
+class LightMap:
+    """Per-tile light levels; update() only recomputes lights whose inputs changed."""
+
+    def __init__(self, world):
+        self.world = world
+        self.ambient = LIGHT_BRIGHT   # level where no light reaches; bright keeps vision unchanged
+        self.lights = {}     # light -> (inputs, bright tiles, dim tiles, chunks)
+        self.bright = {}     # (x, y) -> number of lights brightly lighting it
+        self.dim = {}        # (x, y) -> number of lights dimly lighting it
+        self.revision = 0    # bumped whenever the lit tiles change
+
+    def add(self, light):
+        self.lights[light] = None
+        self.refresh(light)
+        return light
+
+    def remove(self, light):
+        state = self.lights.pop(light, None)
+        if state is not None:
+            self.apply(state, -1)
+
+    def carried_by(self, token_id):
+        return [light for light in self.lights if light.carrier == token_id]
+
+    def position(self, light):
+        if light.carrier is None:
+            return light.x, light.y
+        char = self.world.get_token(light.carrier)
+        return (char.x, char.y) if char is not None else None
+
+    def apply(self, state, delta):
+        _, bright, dim, _ = state
+        self.revision += 1
+        for counts, tiles in ((self.bright, bright), (self.dim, dim)):
+            for key in tiles:
+                n = counts.get(key, 0) + delta
+                if n:
+                    counts[key] = n
+                else:
+                    del counts[key]
+
+    def refresh(self, light):
+        old = self.lights[light]
+        pos = self.position(light)
+        if old is not None:
+            (old_pos, old_radii, stamp), _, _, chunks = old
+            if (old_pos == pos and old_radii == (light.bright, light.dim) and
+                    (not chunks or self.world.sight.stamp(chunks) == stamp)):
+                return False
+            self.apply(old, -1)
+
+        bright, dim, chunks = set(), set(), set()
+        if pos is not None:
+            x, y = pos
+            r = light.dim
+            for ty in range(y - r, y + r + 1):
+                for tx in range(x - r, x + r + 1):
+                    d2 = (tx - x) ** 2 + (ty - y) ** 2
+                    if d2 > r * r:
+                        continue
+                    visible, walked = self.world.sight.walk(x, y, tx, ty, False)
+                    chunks |= walked
+                    if visible:
+                        (bright if d2 <= light.bright * light.bright else dim).add((tx, ty))
+        stamp = self.world.sight.stamp(chunks) if chunks else 0
+        state = ((pos, (light.bright, light.dim), stamp), bright, dim, chunks)
+        self.lights[light] = state
+        self.apply(state, 1)
+        return True
+
+    def update(self):
+        """Recompute the lights whose inputs changed; returns how many did."""
+        return sum(self.refresh(light) for light in list(self.lights))
+
+    def level(self, x, y):
+        if (x, y) in self.bright:
+            return LIGHT_BRIGHT
+        if (x, y) in self.dim:
+            return max(LIGHT_DIM, self.ambient)
+        return self.ambient
+
+    def lit_for(self, viewer, x, y):
+        """Whether viewer has enough light (or darkvision) to see tile (x, y)."""
+        if self.ambient != LIGHT_DARK or getattr(viewer, "vision_type", "") in ("true_sight", "blindsight"):
+            return True
+        if (x, y) in self.bright or (x, y) in self.dim:
+            return True
+        darkvision = getattr(viewer, "darkvision", 0)
+        return (x - viewer.x) ** 2 + (y - viewer.y) ** 2 <= darkvision * darkvision
+
+
+class AreaTemplate:
+    """A spell area (sphere, cone, line or cube) in tile units.
+
+    (x, y) is the point of origin with tile corners on whole numbers;
+    direction is in degrees (0 = east, 90 = south) for cones and lines.
+    A tile is covered when its centre is inside the shape, evaluated as
+    one NumPy mask over the shape's bounding box.
+    """
+
+    CONE_HALF_ANGLE = math.atan(0.5)   # a cone is as wide as it is long
+
+    def __init__(self, shape, x, y, size, direction=0.0, width=1.0):
+        self.shape = shape
+        self.x = x
+        self.y = y
+        self.size = size
+        self.direction = direction
+        self.width = width
+        self.cached = None   # (key, (x0, y0, mask)) of the last mask() call
+
+    def corners(self):
+        if self.shape == "sphere":
+            r = self.size
+            return [(self.x - r, self.y - r), (self.x + r, self.y + r)]
+        if self.shape == "cube":
+            return [(self.x, self.y), (self.x + self.size, self.y + self.size)]
+        rad = math.radians(self.direction)
+        dx, dy = math.cos(rad), math.sin(rad)
+        tip = (self.x + dx * self.size, self.y + dy * self.size)
+        if self.shape == "cone":
+            half = self.size / 2
+            return [(self.x, self.y), (tip[0] - dy * half, tip[1] + dx * half),
+                    (tip[0] + dy * half, tip[1] - dx * half)]
+        half = self.width / 2
+        return [(px - dy * h, py + dx * h) for px, py in ((self.x, self.y), tip) for h in (-half, half)]
+
+    def bounds(self):
+        xs = [x for x, _ in self.corners()]
+        ys = [y for _, y in self.corners()]
+        return math.floor(min(xs)), math.floor(min(ys)), math.ceil(max(xs)), math.ceil(max(ys))
+
+    def cover(self):
+        """(x0, y0, mask) of tiles inside the shape, ignoring walls."""
+        x0, y0, x1, y1 = self.bounds()
+        ys, xs = np.mgrid[y0:y1, x0:x1] + 0.5
+        if self.shape == "cube":
+            mask = ((xs >= self.x) & (xs < self.x + self.size) &
+                    (ys >= self.y) & (ys < self.y + self.size))
+            return x0, y0, mask
+
+        px, py = xs - self.x, ys - self.y
+        if self.shape == "sphere":
+            return x0, y0, px * px + py * py <= self.size * self.size
+
+        rad = math.radians(self.direction)
+        along = px * math.cos(rad) + py * math.sin(rad)
+        across = np.abs(py * math.cos(rad) - px * math.sin(rad))
+        if self.shape == "cone":
+            mask = (along > 0) & (along <= self.size) & (across <= along * math.tan(self.CONE_HALF_ANGLE))
+        else:
+            mask = (along >= 0) & (along <= self.size) & (across <= self.width / 2)
+        return x0, y0, mask
+
+    def mask(self, world, clip_walls=True):
+        """Covered tiles, optionally only those the origin has a clear line to.
+
+        The result is reused until the template moves or the map changes
+        (any segment or door bumps the segment grid's version counter), so
+        the per-tile line-of-sight clip only runs when something did.
+        Treat the returned mask as read-only.
+        """
+        key = (self.shape, self.x, self.y, self.size, self.direction, self.width,
+               clip_walls, world.map.segment_grid.version_counter)
+        if self.cached is not None and self.cached[0] == key:
+            return self.cached[1]
+
+        x0, y0, mask = self.cover()
+        if clip_walls and mask.any():
+            ox, oy = math.floor(self.x), math.floor(self.y)
+            if self.shape in ("cone", "line"):
+                # Origin sits on the tile the template starts from
+                rad = math.radians(self.direction)
+                ox, oy = math.floor(self.x + 0.01 * math.cos(rad)), math.floor(self.y + 0.01 * math.sin(rad))
+            for ty, tx in np.argwhere(mask):
+                if not world.line_of_sight(ox, oy, x0 + int(tx), y0 + int(ty)):
+                    mask[ty, tx] = False
+        self.cached = (key, (x0, y0, mask))
+        return x0, y0, mask
+
+    def affected(self, world, clip_walls=True):
+        """Characters standing on covered tiles."""
+        x0, y0, mask = self.mask(world, clip_walls)
+        h, w = mask.shape
+        return [c for c in world.token_index.in_rect(x0, y0, x0 + w - 1, y0 + h - 1)
+                if mask[c.y - y0, c.x - x0]]
+
+
+class ExploredMask:
+    """Which tiles the party has ever seen, as bit-packed 32x32 chunks.
+
+    Chunks are only allocated once something in them is explored, and the
+    chunks touched since the last save are tracked so saving only has to
+    re-encode those.
+    """
+
+    def __init__(self):
+        self.chunks = {}          # (cx, cy) -> bytearray, one bit per tile
+        self.dirty = set()        # chunks changed since last save
+        self.revisions = {}       # (cx, cy) -> count of changes, for remote views
+        self.revision = 0         # total changes, so remote views can skip an unchanged mask
+        self.saved_as = None      # scene the clean chunks were saved under
+        self.needs_repaint = True
+
+    def mark(self, x, y):
+        key = (x // EXPLORED_CHUNK, y // EXPLORED_CHUNK)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = bytearray(EXPLORED_CHUNK * EXPLORED_CHUNK // 8)
+        bit = (y % EXPLORED_CHUNK) * EXPLORED_CHUNK + (x % EXPLORED_CHUNK)
+        mask = 1 << (bit & 7)
+        if not chunk[bit >> 3] & mask:
+            chunk[bit >> 3] |= mask
+            self.dirty.add(key)
+            self.revisions[key] = self.revisions.get(key, 0) + 1
+            self.revision += 1
+
+    def copy(self, keys):
+        # Frozen copy of some chunks, for reading on another thread
+        mask = ExploredMask()
+        mask.chunks = {key: bytes(self.chunks[key]) for key in keys if key in self.chunks}
+        return mask
+
+    def is_explored(self, x, y):
+        chunk = self.chunks.get((x // EXPLORED_CHUNK, y // EXPLORED_CHUNK))
+        if chunk is None:
+            return False
+        bit = (y % EXPLORED_CHUNK) * EXPLORED_CHUNK + (x % EXPLORED_CHUNK)
+        return bool(chunk[bit >> 3] & (1 << (bit & 7)))
+
+    def row_runs(self):
+        """Yield (x, y, length) horizontal runs of explored tiles."""
+        for (cx, cy), chunk in self.chunks.items():
+            for ly in range(EXPLORED_CHUNK):
+                start = None
+                for lx in range(EXPLORED_CHUNK + 1):
+                    bit = ly * EXPLORED_CHUNK + lx
+                    on = lx < EXPLORED_CHUNK and chunk[bit >> 3] & (1 << (bit & 7))
+                    if on and start is None:
+                        start = lx
+                    elif not on and start is not None:
+                        yield cx * EXPLORED_CHUNK + start, cy * EXPLORED_CHUNK + ly, lx - start
+                        start = None
+
+    @staticmethod
+    def encode_chunk(chunk):
+        # Run-length encode as (count, byte) pairs; explored areas are mostly 0x00 / 0xFF
+        out = bytearray()
+        i = 0
+        while i < len(chunk):
+            value = chunk[i]
+            run = 1
+            while i + run < len(chunk) and chunk[i + run] == value and run < 255:
+                run += 1
+            out += bytes((run, value))
+            i += run
+        return bytes(out)
+
+    @staticmethod
+    def decode_chunk(data):
+        chunk = bytearray()
+        for i in range(0, len(data), 2):
+            chunk += bytes((data[i + 1],)) * data[i]
+        return chunk
+
+
+class ExploredLayer:
+    """Explored-memory pixels per world chunk, copied before a reveal if a frame holds them."""
+
+    def __init__(self, tile_px):
+        self.tile_px = tile_px
+        self.chunk_px = WORLD_CHUNK * tile_px
+        self.chunks = {}   # (cx, cy) -> {tile_px: Surface}
+        self.scaled = OrderedDict()   # ((cx, cy), tile_px) of non-base copies, least recently shown first
+        self.scaled_bytes = 0
+        self.lent = set()   # ((cx, cy), tile_px) handed to a frame since last drawn on
+
+    def frame_surface(self, key, tile_px):
+        # For Renderer.prepare: the surface stays as it is now until the frame is done
+        self.lent.add((key, tile_px))
+        return self.surface(key, tile_px)
+
+    def writable(self, key):
+        """The zoom levels of a chunk, copying any that a frame may still be reading."""
+        self.surface(key)
+        levels = self.chunks[key]
+        for tile_px, surf in levels.items():
+            if (key, tile_px) in self.lent:
+                self.lent.discard((key, tile_px))
+                levels[tile_px] = surf.copy()
+        return levels
+
+    def surface(self, key, tile_px=None):
+        levels = self.chunks.get(key)
+        if levels is None:
+            base = pygame.Surface((self.chunk_px, self.chunk_px), pygame.SRCALPHA)
+            base.fill((0, 0, 0, 255))   # full unexplored
+            levels = self.chunks[key] = {self.tile_px: base}
+
+        tile_px = tile_px or self.tile_px
+        surf = levels.get(tile_px)
+        if surf is None:
+            size = WORLD_CHUNK * tile_px
+            surf = levels[tile_px] = pygame.transform.smoothscale(levels[self.tile_px], (size, size))
+            self.scaled[(key, tile_px)] = None
+            self.scaled_bytes += size * size * 4
+            while self.scaled_bytes > EXPLORED_ZOOM_BUDGET and len(self.scaled) > 1:
+                (old_key, old_px), _ = self.scaled.popitem(last=False)
+                del self.chunks[old_key][old_px]
+                self.lent.discard((old_key, old_px))
+                self.scaled_bytes -= (WORLD_CHUNK * old_px) ** 2 * 4
+        elif tile_px != self.tile_px:
+            self.scaled.move_to_end((key, tile_px))
+        return surf
+
+    def reveal_polygon(self, poly, keys):
+        """Clear poly (world pixels at the base tile size) out of the given chunks."""
+        for key in keys:
+            ox, oy = key[0] * self.chunk_px, key[1] * self.chunk_px
+            for tile_px, surf in self.writable(key).items():
+                k = tile_px / self.tile_px
+                pygame.draw.polygon(surf, (0, 0, 0, 0),
+                                    [(int((x - ox) * k), int((y - oy) * k)) for x, y in poly])
+
+    def reveal_tiles(self, x, y, length):
+        # A row run from ExploredMask never crosses a chunk boundary
+        key = (x // WORLD_CHUNK, y // WORLD_CHUNK)
+        lx, ly = x - key[0] * WORLD_CHUNK, y - key[1] * WORLD_CHUNK
+        for tile_px, surf in self.writable(key).items():
+            surf.fill((0, 0, 0, 0), pygame.Rect(lx * tile_px, ly * tile_px, length * tile_px, tile_px))
+
+    def clear(self):
+        self.chunks.clear()
+        self.scaled.clear()
+        self.scaled_bytes = 0
+        self.lent.clear()
+
+
+# ------------------------------
+# Segment hot-reload
+# ------------------------------
+class SegmentWatcher:
+    """Polls the segment folder and re-parses PNGs whose mtime changed.
+
+    Only segments that are in the cache are re-parsed, on a background
+    thread; for the rest just the new size is read and the next use
+    parses them as usual. apply() is called from the update loop and
+    swaps the results into the MultiMap between frames.
+    """
+
+    def __init__(self, folder, tilewidth, tileheight, interval=SEGMENT_POLL_INTERVAL):
+        self.folder = folder
+        self.tilewidth = tilewidth
+        self.tileheight = tileheight
+        self.interval = interval
+        self.mtimes = self.scan()
+        self.ready = queue.Queue()   # (filename, width, height, parsed SingleMap or None)
+        self.thread = threading.Thread(target=self.poll_loop, daemon=True)
+        self.thread.start()
+
+    def scan(self):
+        # Same "folder/name" form the segments are created with
+        return {f"{self.folder}/{entry.name}": entry.stat().st_mtime
+                for entry in os.scandir(self.folder)
+                if entry.name.lower().endswith(".png")}
+
+    def poll_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                current = self.scan()
+            except OSError:
+                continue
+
+            for filename, mtime in current.items():
+                if self.mtimes.get(filename) == mtime:
+                    continue
+                try:
+                    if filename in segment_cache.filenames:
+                        grid = loadfrompng(filename, self.tilewidth, self.tileheight)
+                        width, height = grid.width, grid.height
+                    else:
+                        grid = None
+                        width, height = png_tile_size(filename, self.tilewidth, self.tileheight)
+                except (OSError, ValueError) as e:
+                    # Probably still being written – try again next poll
+                    print(f"WARNING: could not reload {filename}: {e}")
+                    continue
+                self.mtimes[filename] = mtime
+                self.ready.put((filename, width, height, grid))
+
+    def apply(self, world):
+        while True:
+            try:
+                filename, width, height, grid = self.ready.get_nowait()
+            except queue.Empty:
+                return
+
+            seg = world.map.by_filename.get(filename)
+            if seg is None:
+                seg = MapSegment(filename, self.tilewidth, self.tileheight,
+                                 0, 0, f"Segment {len(world.map.segments) + 1}")
+                world.map.add_segment(seg)
+            seg.width = width
+            seg.height = height
+            seg.version += 1
+            if grid is not None:
+                segment_cache.put(seg, grid)
+            else:
+                segment_cache.discard(seg)   # may have been parsed from the old file meanwhile
+            world.map.segment_changed(seg)
+            print(f"Reloaded {filename}")
+
+
 # ------------------------------
 # World
 # ------------------------------
 class World:
     def __init__(self, game_map):
         self.map = game_map          # This is a MultiMap
-        self.characters = []
+        self.tokens = {}             # token_id -> character, in insertion order
+        self.next_token_id = 1
+        self.token_index = TokenIndex()
+        self.party = TokenGroup()     # player characters
+        self.sight = SightCache(game_map)
+        self.lights = LightMap(self)
+        self.compact = CompactStore()
+        self.moving = {}             # token_id -> character with a queued path
+        self.move_tiles_per_tick = MOVE_TILES_PER_TICK
+        self.move_speed = MOVE_SPEED
+        self.move_budget = 0.0
+        self.explored = ExploredMask()
+        self.visible_tiles = set()    # tiles any PC could see on the last fog pass
+        self.session_log = None
 
-    def add_characters(self, char):
-        self.characters.append(char)
+    @property
+    def characters(self):
+        return self.tokens.values()
+
+    def add_characters(self, char, token_id=None):
+        # token_id is given when recreating a saved or logged token
+        char.token_id = self.next_token_id if token_id is None else token_id
+        self.next_token_id = max(self.next_token_id, char.token_id + 1)
+        self.tokens[char.token_id] = char
+        self.token_index.add(char)
+        if isinstance(char, PlayerCharacter):
+            self.token_index.join(self.party, char)
+        if self.session_log is not None:
+            self.session_log.log_token_add(char)
+
+    def get_token(self, token_id):
+        return self.tokens.get(token_id)
+
+    def remove_character(self, token_id):
+        char = self.tokens.pop(token_id, None)
+        if char is None:
+            return None
+        self.token_index.remove(char)
+        # Out of every group it was in (the party, initiative entries) and no longer carrying lights
+        for group in list(self.token_index.groups_of.get(char, ())):
+            self.token_index.leave(group, char)
+        for light in self.lights.carried_by(token_id):
+            self.lights.remove(light)
+        self.moving.pop(token_id, None)
+        if isinstance(char, CompactCharacter):
+            self.compact.remove(char)
+        if self.session_log is not None:
+            self.session_log.log_token_remove(token_id)
+        return char
+
+    def add_compact(self, x, y, hp, str_score, dex, con, int_score, wis, cha, name, kind="npc", token_id=None):
+        char = self.compact.add(x, y, hp, str_score, dex, con, int_score, wis, cha, name, kind)
+        self.add_characters(char, token_id)
+        # Compact tokens are skipped by the per-tick snap, so place them once here
+        pos = (char.x, char.y)
+        snap_to_walkable(char, self)
+        if self.session_log is not None and (char.x, char.y) != pos:
+            self.session_log.log_move(char)
+        return char
+
+    def characters_of_kind(self, kind):
+        return self.compact.of_kind(kind)
+
+    def change_hp(self, chars, delta):
+        """Apply delta HP to many tokens, clamped to 0..max_hp."""
+        compact = []
+        for c in chars:
+            if isinstance(c, CompactCharacter):
+                compact.append(c)
+            else:
+                c.hp = max(0, min(c.max_hp, c.hp + delta))
+        if compact:
+            self.compact.change_hp(compact, delta)
+        if self.session_log is not None:
+            for c in chars:
+                self.session_log.log_hp(c)
+
+    def queue_move(self, char, steps):
+        char.move_queue = deque(steps)
+        if steps:
+            self.moving[char.token_id] = char
+        else:
+            self.moving.pop(char.token_id, None)
+
+    def steps_this_tick(self, dt):
+        if not self.move_speed:
+            return self.move_tiles_per_tick
+        # Time based: carry fractional tiles over to the next tick
+        self.move_budget += self.move_speed * dt
+        steps = int(self.move_budget)
+        self.move_budget -= steps
+        return steps
+
+    def update_positions(self, dt=0.05):
+        moved = set()
+        for _ in range(self.steps_this_tick(dt)):
+            if not self.moving:
+                break
+
+            # Pop one step from every moving token, then validate them together
+            movers = list(self.moving.values())
+            moved.update(movers)
+            moves = []
+            for char in movers:
+                dx, dy = char.move_queue.popleft()
+                moves.append((char.x, char.y, char.x + dx, char.y + dy))
+
+            for char, (_, _, nx, ny), ok in zip(movers, moves, self.map.can_move_many(moves)):
+                if ok:
+                    char.x, char.y = nx, ny
+                    self.token_index.move(char)
+                if not char.move_queue:
+                    del self.moving[char.token_id]
+                    char.move_queue = deque()
+
+        if not self.moving:
+            self.move_budget = 0.0
+        if self.session_log is not None:
+            for char in moved:
+                self.session_log.log_move(char)
+
+        for char in self.characters:
+            if not isinstance(char, CompactCharacter):
+                snap_to_walkable(char, self)
 
     def can_move_to(self, char, x, y):
         # Ask the MultiMap directly
         return self.map.can_move(char.x, char.y, x, y)
 
+    def line_of_sight(self, x0, y0, x1, y1, through_solid=False):
+        return self.sight.line(x0, y0, x1, y1, through_solid)
+
+    def can_see(self, viewer, target):
+        """Whether viewer can see a character or an (x, y) tile, within its vision radius."""
+        tx, ty = target if isinstance(target, tuple) else (target.x, target.y)
+        radius = getattr(viewer, "vision_radius", None)
+        if radius is not None and (tx - viewer.x) ** 2 + (ty - viewer.y) ** 2 > radius * radius:
+            return False
+        through_solid = getattr(viewer, "vision_type", "") in ("true_sight", "blindsight")
+        # Vision is sight and light together
+        return self.lights.lit_for(viewer, tx, ty) and self.sight.line(viewer.x, viewer.y, tx, ty, through_solid)
+
+    def viewers_of(self, target, viewers=None):
+        """Which of viewers (the party by default) can see target."""
+        return [v for v in (self.party.members if viewers is None else viewers)
+                if v is not target and self.can_see(v, target)]
+
+    def tile_visible(self, x, y):
+        return any(self.can_see(v, (x, y)) for v in self.party.members)
+
 class InitiativeEntry:
-    def __init__(self, name, members, initiative):
+    def __init__(self, name, member_ids, initiative, dex_mod=0):
         self.name = name              # display name
-        self.members = members        # list of Character objects
+        self.member_ids = member_ids  # list of token ids
         self.initiative = initiative  # numeric value
+        self.dex_mod = dex_mod        # breaks initiative ties
+        self.token_group = None       # TokenGroup, made on first use
 
-    def average_position(self):
-        if not self.members:
-            return 0, 0
-        x = sum(c.x for c in self.members) // len(self.members)
-        y = sum(c.y for c in self.members) // len(self.members)
-        return x, y
-# ------------------------------
-# Renderer
-# ------------------------------
-def update_fog_of_war(world, camera):
-    fog_surface.fill((0, 0, 0, 255))  # full fog
+    def members(self, world):
+        # Tokens removed from the world simply drop out of the entry
+        return [c for c in map(world.get_token, self.member_ids) if c is not None]
 
-    for c in world.characters:
-        if not isinstance(c, PlayerCharacter):
-            continue
+    def group(self, world):
+        # Kept up to date by the token index as members move
+        if self.token_group is None:
+            self.token_group = TokenGroup()
+            for c in self.members(world):
+                world.token_index.join(self.token_group, c)
+        return self.token_group
 
-        cx, cy = c.x + 0.5, c.y + 0.5  # player center
-        radius = c.vision_radius
-        points = []
+    def release(self, world):
+        if self.token_group is not None:
+            for c in list(self.token_group.members):
+                world.token_index.leave(self.token_group, c)
+            self.token_group = None
 
-        for angle in range(0, 360, 2):
-            rad = math.radians(angle)
-            dx, dy = math.cos(rad), math.sin(rad)
+    def average_position(self, world):
+        return self.group(world).centroid() or (0, 0)
 
-            x, y = cx, cy
-            tx, ty = int(x), int(y)
-            step_x = 1 if dx > 0 else -1
-            step_y = 1 if dy > 0 else -1
 
-            delta_x = abs(1 / dx) if dx != 0 else float("inf")
-            delta_y = abs(1 / dy) if dy != 0 else float("inf")
 
-            side_x = (tx + 1 - x) * delta_x if dx > 0 else (x - tx) * delta_x
-            side_y = (ty + 1 - y) * delta_y if dy > 0 else (y - ty) * delta_y
+class InitiativeTracker:
+    """Initiative entries kept in turn order.
 
-            dist = 0
-            hit = False
+    Ordered by initiative, then dex mod, then insertion, all descending
+    except insertion; a bisect on the parallel key list finds where an
+    entry goes. The active entry stays active when others are added or
+    removed around it.
+    """
 
-            while dist < radius and not hit:
-                moving_diagonal = False
+    def __init__(self):
+        self.entries = []
+        self.keys = []       # sort key of each entry, same order
+        self.current = 0     # index of the active entry
+        self.counter = 0
 
-                if side_x < side_y:
-                    # horizontal move
-                    tx_next, ty_next = tx + step_x, ty
-                    prev_tile = world.map.get_tile(tx, ty)
-                    next_tile = world.map.get_tile(tx_next, ty_next)
+    def __len__(self):
+        return len(self.entries)
 
-                    # horizontal wall check
-                    if (step_x == 1 and ((prev_tile and prev_tile.blocked_edges["E"]) or (next_tile and next_tile.blocked_edges["W"]))) \
-                       or (step_x == -1 and ((prev_tile and prev_tile.blocked_edges["W"]) or (next_tile and next_tile.blocked_edges["E"]))):
-                        hit = True
-                        break
+    def key(self, entry):
+        self.counter += 1
+        entry.order_key = (-entry.initiative, -entry.dex_mod, self.counter)
+        return entry.order_key
 
-                    tx = tx_next
-                    dist = side_x
-                    side_x += delta_x
-                else:
-                    # vertical move
-                    tx_next, ty_next = tx, ty + step_y
-                    prev_tile = world.map.get_tile(tx, ty)
-                    next_tile = world.map.get_tile(tx_next, ty_next)
-
-                    # vertical wall check
-                    if (step_y == 1 and ((prev_tile and prev_tile.blocked_edges["S"]) or (next_tile and next_tile.blocked_edges["N"]))) \
-                       or (step_y == -1 and ((prev_tile and prev_tile.blocked_edges["N"]) or (next_tile and next_tile.blocked_edges["S"]))):
-                        hit = True
-                        break
+    @property
+    def active(self):
+        return self.entries[self.current] if self.entries else None
+
+    def add(self, entry):
+        key = self.key(entry)
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.entries.insert(i, entry)
+        if i <= self.current and len(self.entries) > 1:
+            self.current += 1
+        return i
+
+    def remove(self, entry):
+        i = bisect_left(self.keys, entry.order_key)
+        del self.keys[i]
+        del self.entries[i]
+        if i < self.current:
+            self.current -= 1
+        elif self.current >= len(self.entries):
+            self.current = 0   # the last entry was active; wrap to the top
+
+    def add_many(self, entries):
+        """Insert a batch with one merge instead of an insert per entry."""
+        active = self.active
+        pairs = list(zip(self.keys, self.entries)) + [(self.key(e), e) for e in entries]
+        pairs.sort(key=lambda pair: pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.entries = [entry for _, entry in pairs]
+        if active is not None:
+            self.current = bisect_left(self.keys, active.order_key)
+
+    def next_turn(self):
+        if self.entries:
+            self.current = (self.current + 1) % len(self.entries)
+
+    def clear(self):
+        self.entries = []
+        self.keys = []
+        self.current = 0
+
+
+class InitiativeListView:
+    """Keeps a Listbox in step with an InitiativeTracker, touching only rows that changed."""
+
+    def __init__(self, listbox):
+        self.listbox = listbox
+        self.entries = []   # entries as currently shown
+        self.rows = []      # row text as currently shown
+
+    @staticmethod
+    def row_text(entry, is_active):
+        marker = "→ " if is_active else ""
+        return f"{marker}{entry.name} ({entry.initiative})"
+
+    def sync(self, tracker, show_turn):
+        new = tracker.entries
+
+        # Rows inserted/removed: only the span between the common ends is replaced
+        start = 0
+        while start < len(new) and start < len(self.entries) and new[start] is self.entries[start]:
+            start += 1
+        old_end, new_end = len(self.entries), len(new)
+        while old_end > start and new_end > start and new[new_end - 1] is self.entries[old_end - 1]:
+            old_end -= 1
+            new_end -= 1
+        if old_end > start:
+            self.listbox.delete(start, old_end - 1)
+        texts = [self.row_text(e, show_turn and start + i == tracker.current)
+                 for i, e in enumerate(new[start:new_end])]
+        if texts:
+            self.listbox.insert(start, *texts)
+        self.entries = list(new)
+        self.rows[start:old_end] = texts
+
+        # Then the turn marker: rewrite only rows whose text differs
+        for i, entry in enumerate(new):
+            text = self.row_text(entry, show_turn and i == tracker.current)
+            if text != self.rows[i]:
+                self.listbox.delete(i)
+                self.listbox.insert(i, text)
+                self.rows[i] = text
+
+
+initiative = InitiativeTracker()
+
+
+def token_record(char):
+    """Everything needed to recreate a token, as JSON-able data."""
+    record = {"id": char.token_id, "name": char.name, "x": char.x, "y": char.y,
+              "hp": char.hp, "max_hp": char.max_hp, "abl": [char.abl[key] for key in ABILITY_KEYS]}
+    if isinstance(char, CompactCharacter):
+        record["kind"] = char.kind
+    elif isinstance(char, PlayerCharacter):
+        record["pc"] = True
+    return record
+
+
+def restore_token(world, record):
+    """Bring the token with the record's id in line with it, recreating it if needed."""
+    char = world.get_token(record["id"])
+    if char is not None and (char.name != record["name"] or
+                             isinstance(char, CompactCharacter) != ("kind" in record)):
+        world.remove_character(char.token_id)   # the id belongs to another token now
+        char = None
+    if char is None:
+        args = (record["x"], record["y"], record["max_hp"], *record["abl"], record["name"])
+        if "kind" in record:
+            char = world.add_compact(*args, kind=record["kind"], token_id=record["id"])
+        else:
+            char = (PlayerCharacter if record.get("pc") else Character)(*args)
+            world.add_characters(char, record["id"])
+    world.queue_move(char, [])
+    char.x, char.y, char.hp = record["x"], record["y"], record["hp"]
+    world.token_index.move(char)
+    return char
 
-                    ty = ty_next
-                    dist = side_y
-                    side_y += delta_y
 
-                # --- CORNER COLLISION CHECK ---
-                if step_x != 0 and step_y != 0:
-                    tile_diag = world.map.get_tile(tx + step_x, ty + step_y)
-                    tile_horiz = world.map.get_tile(tx + step_x, ty)
-                    tile_vert = world.map.get_tile(tx, ty + step_y)
+def restore_tokens(world, records):
+    """Make the world's tokens exactly the recorded ones."""
+    kept = {restore_token(world, record).token_id for record in records}
+    for token_id in [token_id for token_id in world.tokens if token_id not in kept]:
+        world.remove_character(token_id)
 
-                    # check if moving through corner would cross walls on both axes
-                    blocked_horiz = tile_horiz and ((step_x == 1 and tile_horiz.blocked_edges["W"]) or (step_x == -1 and tile_horiz.blocked_edges["E"]))
-                    blocked_vert  = tile_vert and ((step_y == 1 and tile_vert.blocked_edges["N"]) or (step_y == -1 and tile_vert.blocked_edges["S"]))
 
-                    if (blocked_horiz and blocked_vert) or (tile_diag and not tile_diag.walkable):
-                        hit = True
-                        break
+# ------------------------------
+# Encounters
+# ------------------------------
+dice = np.random.default_rng()
 
-                # stop at non-walkable tiles
-                tile = world.map.get_tile(tx, ty)
-                if tile and not tile.walkable and c.vision_type not in ("true_sight", "blindsight"):
-                    hit = True
-                    break
 
-            # final pixel coordinates
-            ray_dist = dist - 0.01
-            px = int(cx * tile_size + dx * ray_dist * tile_size)
-            py = int(cy * tile_size + dy * ray_dist * tile_size)
-            points.append((px, py))
+def roll_initiative(mods):
+    """d20 + mod for every modifier, with all the dice drawn in one call."""
+    rolls = dice.integers(1, 21, size=len(mods)) + np.asarray(mods, dtype=np.int64)
+    return rolls.tolist()
 
-        if points:
-            points.append(points[0])
-            center_px = int(cx * tile_size)
-            center_py = int(cy * tile_size)
-            poly = [(center_px, center_py)] + points
 
-            screen_poly = [(x - camera.x * tile_size, y - camera.y * tile_size) for x, y in poly]
-            pygame.draw.polygon(fog_surface, (0, 0, 0, 0), screen_poly)
-            pygame.draw.polygon(explored_surface, (0, 0, 0, 0), poly)
+class MonsterTemplate:
+    def __init__(self, name, hp, str_score=10, dex=10, con=10, int_score=10, wis=10, cha=10, kind=None):
+        self.name = name
+        self.hp = hp
+        self.scores = (str_score, dex, con, int_score, wis, cha)
+        self.kind = kind or name.lower()
 
 
+GOBLIN = MonsterTemplate("Goblin", 7, 8, 14, 10, 10, 8, 8)
 
 
+def find_spawn_tiles(world, x, y, count):
+    """Up to count free walkable tiles reachable from (x, y), nearest first."""
+    tiles = []
+    seen = {(x, y)}
+    frontier = deque([(x, y)])
+    while frontier and len(tiles) < count:
+        tx, ty = frontier.popleft()
+        tile = world.map.get_tile(tx, ty)
+        if tile is None or not tile.walkable:
+            continue
+        if not world.token_index.at(tx, ty):
+            tiles.append((tx, ty))
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nxt = (tx + dx, ty + dy)
+            if nxt not in seen and world.map.can_move(tx, ty, *nxt):
+                seen.add(nxt)
+                frontier.append(nxt)
+    return tiles
+
+
+def next_spawn_number(world, template):
+    # Continue after the highest "<name> <n>" already on the map
+    prefix = template.name + " "
+    numbers = [int(c.name[len(prefix):]) for c in world.characters_of_kind(template.kind)
+               if c.name.startswith(prefix) and c.name[len(prefix):].isdigit()]
+    return max(numbers, default=0) + 1
+
+
+def spawn_encounter(world, template, count, x, y):
+    """Spawn up to count copies of template around (x, y) as compact tokens."""
+    chars = []
+    first = next_spawn_number(world, template)
+    for i, (tx, ty) in enumerate(find_spawn_tiles(world, x, y, count)):
+        chars.append(world.add_compact(tx, ty, template.hp, *template.scores,
+                                       f"{template.name} {first + i}", template.kind))
+    return chars
+
+
+def encounter_entries(chars, group_by="kind"):
+    """Initiative entries for chars, rolled in one batch.
+
+    group_by="kind" gives one entry (and one roll) per creature kind,
+    None gives every creature its own entry, and a function of a
+    character groups by whatever it returns.
+    """
+    if group_by is None:
+        groups = [[c] for c in chars]
+    else:
+        key = (lambda c: getattr(c, "kind", "npc")) if group_by == "kind" else group_by
+        by_key = {}
+        for c in chars:
+            by_key.setdefault(key(c), []).append(c)
+        groups = list(by_key.values())
+
+    mods = [max(c.initiative_mod for c in group) for group in groups]
+    entries = []
+    for group, mod, total in zip(groups, mods, roll_initiative(mods)):
+        name = group[0].name if len(group) == 1 else f"{group[0].name.rsplit(' ', 1)[0]} x{len(group)}"
+        entries.append(InitiativeEntry(name, [c.token_id for c in group], total, mod))
+    return entries
+# ------------------------------
+# Renderer
+# ------------------------------
 class Renderer:
     walkableclr = (255, 255, 255)
     blockedclr = (50, 50, 50)
     wallclr = (0, 0, 0)
+    doorclr = (139, 69, 19)
+    opendoorclr = (210, 170, 110)
     DMcolour = (200, 50, 50, 100)
     charclr = (0, 0, 255)
 
     def __init__(self, tilewidth, tileheight):
+        # Base tile size; zoom levels are derived from it
         self.tilewidth = tilewidth
         self.tileheight = tileheight
-
-    def draw(self, screen, world, camera, dm_view=False):
-        screen.fill((50, 50, 50))
-
-        # Draw tiles
-        for ty in range(camera.y, camera.y + camera.height):
-            for tx in range(camera.x, camera.x + camera.width):
-                if not world.map.in_bounds(tx, ty):
-                    continue
-
-                tile = world.map.get_tile(tx, ty)
-                sx, sy = camera.world_to_screen(tx, ty)
-
-                rect = pygame.Rect(
-                    sx * self.tilewidth,
-                    sy * self.tileheight,
-                    self.tilewidth,
-                    self.tileheight
-                )
+        self.chunk_layers = OrderedDict()   # (chunk, dm_view, tile_px) -> (cell version, surface)
+        self.chunk_bytes = 0
+        self.font = None
+        self.aoe_overlay = None   # (mask, tile_px, scaled surface) of the area preview
+        self.fog_copy = None      # (fog_revision, copy of fog_surface) shared by frames
+
+    def render_tiles(self, surf, seg, tile_px, dm_view, x0, y0):
+        """Draw the part of seg inside the chunk whose top-left tile is (x0, y0)."""
+        overlay = pygame.Surface((tile_px, tile_px), pygame.SRCALPHA)
+        overlay.fill(self.DMcolour)
+        grid = seg.map
+        left, top = seg.offset_x - x0, seg.offset_y - y0
+
+        for ty in range(max(0, -top), min(seg.height, WORLD_CHUNK - top)):
+            for tx in range(max(0, -left), min(seg.width, WORLD_CHUNK - left)):
+                tile = grid.get_tile(tx, ty)
+                rect = pygame.Rect((left + tx) * tile_px, (top + ty) * tile_px, tile_px, tile_px)
 
                 colour = self.walkableclr if tile.walkable else self.blockedclr
-                pygame.draw.rect(screen, colour, rect)
+                pygame.draw.rect(surf, colour, rect)
 
                 # Grid
-                pygame.draw.rect(screen, (100, 100, 100), rect, 1)
+                pygame.draw.rect(surf, (100, 100, 100), rect, 1)
                 # Draw interior walls (DM only or always – your choice)
                 if tile.blocked_edges["N"]:
-                    pygame.draw.line(screen, self.wallclr,
+                    pygame.draw.line(surf, self.wallclr,
                                      rect.topleft, rect.topright, 3)
 
                 if tile.blocked_edges["S"]:
-                    pygame.draw.line(screen, self.wallclr,
+                    pygame.draw.line(surf, self.wallclr,
                                      rect.bottomleft, rect.bottomright, 3)
 
                 if tile.blocked_edges["W"]:
-                    pygame.draw.line(screen, self.wallclr,
+                    pygame.draw.line(surf, self.wallclr,
                                      rect.topleft, rect.bottomleft, 3)
 
                 if tile.blocked_edges["E"]:
-                    pygame.draw.line(screen, self.wallclr,
+                    pygame.draw.line(surf, self.wallclr,
                                      rect.topright, rect.bottomright, 3)
 
                 # DM overlay
                 if dm_view and not tile.walkable:
-                    overlay = pygame.Surface((self.tilewidth, self.tileheight), pygame.SRCALPHA)
-                    overlay.fill(self.DMcolour)
-                    screen.blit(overlay, rect.topleft)
+                    surf.blit(overlay, rect.topleft)
+
+    def chunk_layer(self, world, chunk, tile_px, dm_view):
+        """One world chunk with its segments composited in, cached per zoom level.
+
+        Segments are drawn straight into the chunk, so the map is only held
+        once; the cache is capped at CHUNK_LAYER_BUDGET bytes, least
+        recently shown chunks going first.
+        """
+        grid = world.map.segment_grid
+        version = grid.cell_versions.get(chunk)
+        key = (chunk, dm_view, tile_px)
+        cached = self.chunk_layers.get(key)
+        if cached is not None and cached[0] == version:
+            self.chunk_layers.move_to_end(key)
+            return cached[1]
+
+        size = WORLD_CHUNK * tile_px
+        if tile_px < self.tilewidth:
+            # Mipmap: shrink the next level up instead of drawing tiny tiles
+            parent = self.chunk_layer(world, chunk, tile_px * 2, dm_view)
+            surf = pygame.transform.smoothscale(parent, (size, size))
+        else:
+            surf = pygame.Surface((size, size), pygame.SRCALPHA)
+            x0, y0 = chunk[0] * WORLD_CHUNK, chunk[1] * WORLD_CHUNK
+            # First segment in the list ends on top
+            for seg in reversed(grid.cells.get(chunk, ())):
+                if not getattr(seg, "active", True):
+                    continue
+                self.render_tiles(surf, seg, tile_px, dm_view, x0, y0)
+
+            # Doors are drawn per chunk so toggling one only redraws its chunks
+            for door in world.map.doors.in_chunk(chunk):
+                ex, ey = (door.x + 1, door.y) if door.side == "E" else (door.x, door.y + 1)
+                start = ((ex - x0) * tile_px, (ey - y0) * tile_px)
+                end = (start[0], start[1] + tile_px) if door.side == "E" else (start[0] + tile_px, start[1])
+                if door.is_open:
+                    pygame.draw.line(surf, self.opendoorclr, start, end, 1)
+                else:
+                    pygame.draw.line(surf, self.doorclr, start, end, 5)
+
+        stale = self.chunk_layers.pop(key, None)   # re-read: building the parent may have evicted it
+        if stale is not None:
+            self.chunk_bytes -= stale[1].get_width() * stale[1].get_height() * 4
+        self.chunk_layers[key] = (version, surf)
+        self.chunk_layers.move_to_end(key)
+        self.chunk_bytes += size * size * 4
+        while self.chunk_bytes > CHUNK_LAYER_BUDGET and len(self.chunk_layers) > 1:
+            _, (_, old) = self.chunk_layers.popitem(last=False)
+            self.chunk_bytes -= old.get_width() * old.get_height() * 4
+        return surf
+
+    def prepare(self, world, camera, dm_view=False):
+        """Snapshot everything one view needs into a ViewFrame (runs on the Tk thread)."""
+        frame = ViewFrame()
+        tile_px = camera.tile_px
+
+        # Map: the cached chunks in view; chunks without segments are skipped
+        grid = world.map.segment_grid
+        chunks = grid.cell_keys(camera.x, camera.y, camera.x + camera.width, camera.y + camera.height)
+        for chunk in chunks:
+            if chunk not in grid.cells:
+                continue
+            sx, sy = camera.world_to_screen(chunk[0] * WORLD_CHUNK, chunk[1] * WORLD_CHUNK)
+            frame.layers.append((self.chunk_layer(world, chunk, tile_px, dm_view), (sx * tile_px, sy * tile_px)))
 
-        # Draw characters
-        for char in world.characters:
+        # Characters
+        frame.radius = max(2, tile_px // 3)
+        for char in world.token_index.in_rect(camera.x, camera.y,
+                                              camera.x + camera.width - 1, camera.y + camera.height - 1):
             sx, sy = camera.world_to_screen(char.x, char.y)
-            px = sx * self.tilewidth + self.tilewidth // 2
-            py = sy * self.tileheight + self.tileheight // 2
-            radius = self.tilewidth // 3
-
-            pygame.draw.circle(screen, self.charclr, (px, py), radius)
+            frame.tokens.append((sx * tile_px + tile_px // 2, sy * tile_px + tile_px // 2,
+                                 char.token_id == selected_token_id))
 
-            if world.characters.index(char) == selected_char_index:
-                pygame.draw.circle(screen, (255, 255, 0), (px, py), radius + 2, 2)
         # ---- Fog of War (player view only) ----
         if not dm_view:
-            screen.blit(
-                explored_surface,
-                (0, 0),
-                area=pygame.Rect(
-                    camera.x * tile_size,
-                    camera.y * tile_size,
-                    surface_width,
-                    surface_height
-                )
-            )
-            screen.blit(fog_surface, (0, 0))
+            chunk_px = WORLD_CHUNK * tile_px
+            for chunk in chunks:
+                sx, sy = camera.world_to_screen(chunk[0] * WORLD_CHUNK, chunk[1] * WORLD_CHUNK)
+                if chunk in grid.cells:
+                    frame.fog.append((explored_layer.frame_surface(chunk, tile_px), (sx * tile_px, sy * tile_px)))
+                else:
+                    frame.fog.append((None, pygame.Rect(sx * tile_px, sy * tile_px, chunk_px, chunk_px)))
+            # Screen-space fog is drawn over in place, so frames get a copy of it
+            if self.fog_copy is None or self.fog_copy[0] != fog_revision:
+                self.fog_copy = (fog_revision, fog_surface.copy())
+            frame.fog.append((self.fog_copy[1], (0, 0)))
+
+        # ---- Area template preview (DM only) ----
+        if dm_view and aoe_preview is not None:
+            x0, y0, mask = aoe_preview.mask(world)
+            h, w = mask.shape
+            if w and h:
+                # The mask object is only replaced when the template changes
+                if self.aoe_overlay is None or self.aoe_overlay[0] is not mask or self.aoe_overlay[1] != tile_px:
+                    rgba = np.zeros((h, w, 4), dtype=np.uint8)
+                    rgba[mask] = (255, 120, 0, 110)
+                    overlay = pygame.image.frombuffer(rgba.tobytes(), (w, h), "RGBA")
+                    overlay = pygame.transform.scale(overlay, (w * tile_px, h * tile_px))
+                    self.aoe_overlay = (mask, tile_px, overlay)
+                overlay = self.aoe_overlay[2]
+                sx, sy = camera.world_to_screen(x0, y0)
+                frame.overlays.append((overlay, (sx * tile_px, sy * tile_px)))
 
         # ---- Segment manager overlay (DM only) ----
         if dm_view and segment_manager_mode:
+            if self.font is None:
+                self.font = pygame.font.SysFont(None, 24)
             for seg in world.map.segments:
                 # Segment world coords → screen
                 sx, sy = camera.world_to_screen(seg.offset_x, seg.offset_y)
 
                 rect = pygame.Rect(
-                    sx * self.tilewidth,
-                    sy * self.tileheight,
-                    seg.width * self.tilewidth,
-                    seg.height * self.tileheight
+                    sx * tile_px,
+                    sy * tile_px,
+                    seg.width * tile_px,
+                    seg.height * tile_px
                 )
 
-                # Bounding box
-                pygame.draw.rect(screen, (0, 200, 255), rect, 3)
+                # Bounding box and name label
+                frame.boxes.append(((0, 200, 255), rect, self.font.render(seg.name, True, (0, 200, 255))))
+
+            # Overlapping segments shadow each other – flag them
+            for _, _, (ox, oy, ow, oh) in world.map.segment_grid.overlaps():
+                sx, sy = camera.world_to_screen(ox, oy)
+                rect = pygame.Rect(sx * tile_px, sy * tile_px,
+                                   ow * tile_px, oh * tile_px)
+                frame.boxes.append(((255, 0, 0), rect, None))
 
-                # Name label
-                font = pygame.font.SysFont(None, 24)
-                label = font.render(seg.name, True, (0, 200, 255))
+        return frame
+
+    def paint(self, screen, frame):
+        """Draw a prepared frame; touches nothing but the frame and screen."""
+        screen.fill((50, 50, 50))
+        for surf, pos in frame.layers:
+            screen.blit(surf, pos)
+
+        for px, py, selected in frame.tokens:
+            pygame.draw.circle(screen, self.charclr, (px, py), frame.radius)
+            if selected:
+                pygame.draw.circle(screen, (255, 255, 0), (px, py), frame.radius + 2, 2)
+
+        for surf, pos in frame.fog:
+            if surf is None:
+                screen.fill((0, 0, 0), pos)
+            else:
+                screen.blit(surf, pos)
+
+        for surf, pos in frame.overlays:
+            screen.blit(surf, pos)
+
+        for colour, rect, label in frame.boxes:
+            pygame.draw.rect(screen, colour, rect, 3)
+            if label is not None:
                 screen.blit(label, (rect.x + 4, rect.y + 4))
 
 
+class ViewFrame:
+    """Draw list for one view, built by Renderer.prepare."""
+
+    def __init__(self):
+        self.layers = []     # (surface, pos) map chunks
+        self.radius = 0
+        self.tokens = []     # (px, py, selected)
+        self.fog = []        # (surface, pos), or (None, rect) for solid black
+        self.overlays = []   # (surface, pos)
+        self.boxes = []      # (colour, rect, label surface or None)
+
+
+class ViewWorker:
+    """Paints one view's frames on its own thread.
+
+    pygame releases the GIL while it fills and blits, so the player and
+    DM views paint at the same time. The Tk thread submits a prepared
+    frame and presents the surface once done is set; a paint that
+    failed is re-raised there rather than showing the previous frame.
+    """
+
+    def __init__(self, renderer, surface, name):
+        self.renderer = renderer
+        self.surface = surface
+        self.name = name
+        self.rgb = None
+        self.error = None
+        self.done = threading.Event()
+        self.done.set()
+        self.jobs = queue.Queue()
+        threading.Thread(target=self.run, name=name, daemon=True).start()
+
+    def submit(self, frame):
+        self.done.clear()
+        self.jobs.put(frame)
+
+    def run(self):
+        while True:
+            frame = self.jobs.get()
+            if frame is None:
+                return
+            try:
+                self.renderer.paint(self.surface, frame)
+                self.rgb = pygame.image.tostring(self.surface, "RGB")
+            except Exception as e:
+                self.rgb = None
+                self.error = e
+            self.done.set()
+
+    def result(self):
+        """RGB bytes of the finished frame; call once done is set."""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"{self.name} failed to paint a frame") from error
+        return self.rgb
+
+    def stop(self):
+        self.jobs.put(None)
+
+
 # ------------------------------
 # Setup world and map segments
 # ------------------------------
@@ -494,14 +2226,216 @@ def load_all_scenes():
     return data
 
 
-def save_all_scenes(data):
-    with open(SCENE_SAVE_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+# Campaign file layout:
+#   CAMPAIGN_MAGIC
+#   8-byte big-endian header length
+#   JSON header {section: [[name, offset, length], ...]}, offsets relative to the bodies
+#   bodies back to back: compact JSON for "scenes", raw bytes for "blobs"
+def read_campaign_index(path):
+    """Return {(section, name): (absolute offset, length)}, or None if there is no campaign file."""
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        if f.read(len(CAMPAIGN_MAGIC)) != CAMPAIGN_MAGIC:
+            print(f"WARNING: {path} is not a campaign file — ignoring it")
+            return None
+        (header_len,) = struct.unpack(">Q", f.read(8))
+        header = json.loads(f.read(header_len))
+
+    body_start = len(CAMPAIGN_MAGIC) + 8 + header_len
+    index = {}
+    for section, entries in header.items():
+        for name, offset, length in entries:
+            index[(section, name)] = (body_start + offset, length)
+    return index
+
+
+def read_campaign_body(path, offset, length):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def write_campaign_tmp(path, bodies):
+    """Write [((section, name), body bytes), ...] to a temp file next to path.
+
+    Returns (tmp_path, index); the caller os.replace()s it into place so a
+    crash mid-write never leaves a half-written campaign behind.
+    """
+    header = {}
+    offset = 0
+    for (section, name), body in bodies:
+        header.setdefault(section, []).append([name, offset, len(body)])
+        offset += len(body)
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CAMPAIGN_MAGIC)
+        f.write(struct.pack(">Q", len(header_bytes)))
+        f.write(header_bytes)
+        for _, body in bodies:
+            f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+
+    body_start = len(CAMPAIGN_MAGIC) + 8 + len(header_bytes)
+    index = {}
+    for section, entries in header.items():
+        for name, offset, length in entries:
+            index[(section, name)] = (body_start + offset, length)
+    return tmp_path, index
+
+
+class SceneStore:
+    """Campaign scenes, parsed on first use and saved by a coalescing background writer."""
+
+    COALESCE_DELAY = 0.25   # seconds
+    RETRY_DELAY = 5.0       # seconds before retrying a failed write
+
+    def __init__(self, path=CAMPAIGN_FILE):
+        self.path = path
+        self.lock = threading.Lock()         # guards the dicts below and the file swap
+        self.write_lock = threading.Lock()   # one writer at a time
+        self.dirty = threading.Event()
+        self.changes = 0     # bumped on every change, so a flush knows if it wrote the latest
+        self.closed = False
+
+        self.index = read_campaign_index(path)
+        self.pending = {}    # (section, name) -> value saved but not yet written
+        self.cache = {}      # (section, name) -> value already read
+        if self.index is None:
+            # First run: import the old scenes.json
+            self.index = {}
+            self.pending = {("scenes", name): layout for name, layout in load_all_scenes().items()}
+            if self.pending:
+                self.dirty.set()
+        self.order = dict.fromkeys(list(self.index) + list(self.pending))
+
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def names(self):
+        with self.lock:
+            return [name for section, name in self.order if section == "scenes"]
+
+    def blob_names(self, prefix):
+        with self.lock:
+            return [name for section, name in self.order
+                    if section == "blobs" and name.startswith(prefix)]
+
+    def read(self, key):
+        with self.lock:
+            if key in self.pending:
+                return self.pending[key]
+            if key in self.cache:
+                return self.cache[key]
+            if key not in self.order or key not in self.index:
+                return None
+            body = read_campaign_body(self.path, *self.index[key])
+            value = json.loads(body) if key[0] == "scenes" else body
+            self.cache[key] = value
+            return value
+
+    def write(self, key, value):
+        with self.lock:
+            self.pending[key] = value
+            self.cache.pop(key, None)
+            self.order[key] = None
+            self.changes += 1
+        self.dirty.set()
+
+    def remove(self, keys):
+        removed = False
+        with self.lock:
+            for key in keys:
+                if key in self.order:
+                    del self.order[key]
+                    self.pending.pop(key, None)
+                    self.cache.pop(key, None)
+                    removed = True
+                    self.changes += 1
+        if removed:
+            self.dirty.set()
+
+    def get(self, name):
+        return self.read(("scenes", name))
+
+    def put(self, name, layout):
+        self.write(("scenes", name), layout)
+
+    def get_blob(self, name):
+        return self.read(("blobs", name))
+
+    def put_blob(self, name, data):
+        self.write(("blobs", name), bytes(data))
+
+    def __contains__(self, name):
+        with self.lock:
+            return ("scenes", name) in self.order
+
+    @staticmethod
+    def blob_key(scene_name, part=""):
+        # "/" in a scene name is escaped, so one scene's prefix never matches another's blobs
+        return scene_name.replace("%", "%25").replace("/", "%2F") + "/" + part
+
+    def delete(self, name):
+        # A scene takes its saved state with it
+        blobs = [("blobs", blob) for blob in self.blob_names(self.blob_key(name))]
+        self.remove([("scenes", name)] + blobs)
+
+    def write_loop(self):
+        while not self.closed:
+            self.dirty.wait()
+            time.sleep(self.COALESCE_DELAY)
+            try:
+                self.flush()
+            except Exception as e:
+                # Still dirty, so the next pass retries; keep the writer alive
+                print(f"WARNING: could not save {self.path}: {e}")
+                time.sleep(self.RETRY_DELAY)
+
+    def flush(self):
+        with self.write_lock:
+            if not self.dirty.is_set():
+                return
+            with self.lock:
+                changes = self.changes
+                keys = list(self.order)
+                pending = dict(self.pending)   # values are replaced, never mutated
+                index = dict(self.index)
+
+            # Only this thread replaces the file, so reading old bodies is safe
+            bodies = []
+            for key in keys:
+                if key not in pending:
+                    body = read_campaign_body(self.path, *index[key])
+                elif key[0] == "scenes":
+                    body = json.dumps(pending[key], separators=(",", ":")).encode("utf-8")
+                else:
+                    body = pending[key]
+                bodies.append((key, body))
+            tmp_path, new_index = write_campaign_tmp(self.path, bodies)
+
+            with self.lock:
+                os.replace(tmp_path, self.path)
+                self.index = new_index
+                if self.changes == changes:
+                    self.dirty.clear()   # otherwise a save came in while writing; go again
+                for key, value in pending.items():
+                    # Written values move to the read cache unless saved again meanwhile
+                    if self.pending.get(key) is value:
+                        del self.pending[key]
+                        if key in self.order:
+                            self.cache[key] = value
+
+    def close(self):
+        self.closed = True
+        self.flush()
 
 
 def save_scene(scene_name, world):
-    scenes = load_all_scenes()
-
     data = []
     for seg in world.map.segments:
         data.append({
@@ -511,44 +2445,372 @@ def save_scene(scene_name, world):
             "active": seg.active
         })
 
-    scenes[scene_name] = data
-    save_all_scenes(scenes)
+    scene_store.put(scene_name, data)
+    save_scene_state(scene_name, world)
 
     print(f"Scene '{scene_name}' saved.")
 
 
+def save_scene_state(scene_name, world):
+    tokens = [token_record(c) for c in world.characters]
+    scene_store.put_blob(SceneStore.blob_key(scene_name, "tokens"), json.dumps(tokens).encode("utf-8"))
+
+    # Only chunks explored since the last save need re-encoding,
+    # unless this is a different scene than they were saved under
+    explored = world.explored
+    keys = explored.dirty if explored.saved_as == scene_name else explored.chunks.keys()
+    for cx, cy in list(keys):
+        scene_store.put_blob(SceneStore.blob_key(scene_name, f"explored/{cx},{cy}"),
+                             ExploredMask.encode_chunk(explored.chunks[(cx, cy)]))
+    explored.dirty.clear()
+    explored.saved_as = scene_name
+
+    doors = [[d.x, d.y, d.side, d.is_open] for d in world.map.doors.doors.values()]
+    scene_store.put_blob(SceneStore.blob_key(scene_name, "doors"), json.dumps(doors).encode("utf-8"))
+
+
+def load_scene_state(scene_name, world):
+    explored = ExploredMask()
+    prefix = SceneStore.blob_key(scene_name, "explored/")
+    for name in scene_store.blob_names(prefix):
+        cx, cy = map(int, name[len(prefix):].split(","))
+        explored.chunks[(cx, cy)] = ExploredMask.decode_chunk(scene_store.get_blob(name))
+    explored.saved_as = scene_name
+    world.explored = explored
+
+    world.map.doors.clear()
+    doors = scene_store.get_blob(SceneStore.blob_key(scene_name, "doors"))
+    for x, y, side, is_open in json.loads(doors) if doors else ():
+        world.map.doors.add(Door(x, y, side, is_open))
+
+    tokens = scene_store.get_blob(SceneStore.blob_key(scene_name, "tokens"))
+    if tokens is None:
+        return
+    tokens = json.loads(tokens)
+    if tokens and "abl" in tokens[0]:
+        restore_tokens(world, tokens)
+        return
+    # Older saves only kept the positions of tokens that already exist
+    for saved in tokens:
+        char = world.get_token(saved["id"])
+        if char is None or char.name != saved["name"]:
+            continue
+        char.x, char.y = saved["x"], saved["y"]
+        char.hp = saved["hp"]
+        world.token_index.move(char)
+
+
 def load_scene(scene_name, world):
     global current_scene
 
-    scenes = load_all_scenes()
-    if scene_name not in scenes:
+    layout = scene_store.get(scene_name)
+    if layout is None:
         print("Scene not found:", scene_name)
         return
 
-    layout = scenes[scene_name]
-
     for saved in layout:
-        for seg in world.map.segments:
-            if seg.filename == saved["filename"]:
-                seg.offset_x = saved["offset_x"]
-                seg.offset_y = saved["offset_y"]
-                seg.active   = saved.get("active", True)
+        seg = world.map.by_filename.get(saved["filename"])
+        if seg is None:
+            continue
+        seg.offset_x = saved["offset_x"]
+        seg.offset_y = saved["offset_y"]
+        seg.active   = saved.get("active", True)
+        world.map.segment_changed(seg)
 
+    load_scene_state(scene_name, world)
     current_scene = scene_name
 
     print(f"Scene '{scene_name}' loaded.")
 
 
+# ------------------------------
+# Session log
+# ------------------------------
+# Append-only: a magic line, then records of
+#   type (u8), seconds since the session started (f64), payload length (u32), payload
+# Snapshots hold the whole table state (zlib'd JSON); everything else is
+# a small delta, so seeking = nearest earlier snapshot + a short tail.
+SESSION_MAGIC = b"VTTSESSION1\n"
+EV_SNAPSHOT, EV_SCENE, EV_MOVE, EV_SEGMENT, EV_EXPLORED, EV_INITIATIVE, EV_DOOR, \
+    EV_TOKEN_ADD, EV_TOKEN_REMOVE, EV_HP = range(10)
+SESSION_RECORD = struct.Struct(">BdI")
+MOVE_RECORD = struct.Struct(">Iii")        # token id, x, y
+SEGMENT_RECORD = struct.Struct(">Hiib")    # segment index, offset x, offset y, active
+EXPLORED_RECORD = struct.Struct(">ii")     # chunk x, y, then the RLE chunk
+DOOR_RECORD = struct.Struct(">iiBb")       # x, y, side (0 east, 1 south), open (-1 = removed)
+TOKEN_RECORD = struct.Struct(">I")         # token id (EV_TOKEN_ADD carries a JSON token record)
+HP_RECORD = struct.Struct(">Ii")           # token id, hp
+
+
+class SessionLog:
+    """Session log; records are queued here and batched to disk by a writer thread."""
+
+    COALESCE_DELAY = 0.5   # seconds
+    snapshot_records = {}  # record type -> fn() giving its current state, for types added elsewhere
+
+    def __init__(self, path):
+        self.path = path
+        self.start = time.perf_counter()
+        self.queue = queue.SimpleQueue()
+        self.explored = None
+        self.chunk_revisions = {}   # (cx, cy) -> explored revision last logged
+        self.last_explored = 0.0
+        self.last_snapshot = None
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def log(self, kind, payload):
+        self.queue.put((kind, time.perf_counter() - self.start, payload))
+
+    def log_move(self, char):
+        self.log(EV_MOVE, MOVE_RECORD.pack(char.token_id, char.x, char.y))
+
+    def log_segment(self, world, seg):
+        index = world.map.segments.index(seg)
+        self.log(EV_SEGMENT, SEGMENT_RECORD.pack(index, seg.offset_x, seg.offset_y, seg.active))
+
+    def log_scene(self, world, scene_name):
+        self.log(EV_SCENE, scene_name.encode("utf-8"))
+        self.snapshot(world, scene_name)
+
+    def log_door(self, door, removed=False):
+        state = -1 if removed else int(door.is_open)
+        self.log(EV_DOOR, DOOR_RECORD.pack(door.x, door.y, door.side == "S", state))
+
+    def log_token_add(self, char):
+        self.log(EV_TOKEN_ADD, json.dumps(token_record(char)).encode("utf-8"))
+
+    def log_token_remove(self, token_id):
+        self.log(EV_TOKEN_REMOVE, TOKEN_RECORD.pack(token_id))
+
+    def log_hp(self, char):
+        self.log(EV_HP, HP_RECORD.pack(char.token_id, char.hp))
+
+    def log_initiative(self, state):
+        self.log(EV_INITIATIVE, json.dumps(state).encode("utf-8"))
+
+    def log_explored(self, world):
+        explored = world.explored
+        if explored is not self.explored:
+            # New scene: its chunks went out with the scene's snapshot
+            self.explored = explored
+            self.chunk_revisions = dict(explored.revisions)
+            return
+        for key, revision in explored.revisions.items():
+            if self.chunk_revisions.get(key) != revision:
+                self.chunk_revisions[key] = revision
+                self.log(EV_EXPLORED, EXPLORED_RECORD.pack(*key) + bytes(explored.chunks[key]))
+
+    def snapshot(self, world, scene_name):
+        self.last_snapshot = time.perf_counter()
+        self.explored = world.explored
+        self.chunk_revisions = dict(world.explored.revisions)
+        self.log(EV_SNAPSHOT, {
+            "scene": scene_name,
+            "tokens": [token_record(c) for c in world.characters],
+            "segments": [[seg.offset_x, seg.offset_y, seg.active] for seg in world.map.segments],
+            "explored": {key: bytes(chunk) for key, chunk in world.explored.chunks.items()},
+            "doors": [[d.x, d.y, d.side, d.is_open] for d in world.map.doors.doors.values()],
+            "records": {str(kind): state() for kind, state in self.snapshot_records.items()},
+        })
+
+    def tick(self, world, scene_name):
+        now = time.perf_counter()
+        if self.last_snapshot is None or now - self.last_snapshot >= SESSION_SNAPSHOT_INTERVAL:
+            self.snapshot(world, scene_name)
+        elif now - self.last_explored >= SESSION_EXPLORED_INTERVAL:
+            self.last_explored = now
+            self.log_explored(world)
+
+    @staticmethod
+    def encode(kind, payload):
+        if kind == EV_SNAPSHOT:
+            payload = dict(payload, explored={f"{cx},{cy}": ExploredMask.encode_chunk(chunk).hex()
+                                              for (cx, cy), chunk in payload["explored"].items()})
+            payload = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        elif kind == EV_EXPLORED:
+            payload = payload[:EXPLORED_RECORD.size] + ExploredMask.encode_chunk(payload[EXPLORED_RECORD.size:])
+        return payload
+
+    def write_loop(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "ab") as f:
+            if new_file:
+                f.write(SESSION_MAGIC)
+            while True:
+                items = [self.queue.get()]
+                time.sleep(self.COALESCE_DELAY)
+                while not self.queue.empty():
+                    items.append(self.queue.get())
+                out = bytearray()
+                for item in items:
+                    if item is None:
+                        continue
+                    kind, t, payload = item
+                    payload = self.encode(kind, payload)
+                    out += SESSION_RECORD.pack(kind, t, len(payload)) + payload
+                f.write(out)
+                f.flush()
+                if None in items:
+                    return
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join(timeout=5)
+
+
+def new_session_path():
+    os.makedirs(SESSION_FOLDER, exist_ok=True)
+    return os.path.join(SESSION_FOLDER, time.strftime("session-%Y%m%d-%H%M%S.vttlog"))
+
+
+def latest_session_path(exclude=None):
+    if not os.path.isdir(SESSION_FOLDER):
+        return None
+    logs = sorted(os.path.join(SESSION_FOLDER, name) for name in os.listdir(SESSION_FOLDER)
+                  if name.endswith(".vttlog"))
+    logs = [path for path in logs if path != exclude]
+    return logs[-1] if logs else None
+
+
+def read_session_log(path, offset=None, payloads=True):
+    """Yield (offset, type, time, payload) records; a torn last record (crash) ends the log."""
+    with open(path, "rb") as f:
+        if f.read(len(SESSION_MAGIC)) != SESSION_MAGIC:
+            return
+        if offset is not None:
+            f.seek(offset)
+        while True:
+            pos = f.tell()
+            header = f.read(SESSION_RECORD.size)
+            if len(header) < SESSION_RECORD.size:
+                return
+            kind, t, length = SESSION_RECORD.unpack(header)
+            if payloads:
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+            else:
+                payload = None
+                f.seek(length, os.SEEK_CUR)
+            yield pos, kind, t, payload
+
+
+class SessionReplay:
+    """Seek a session log: restore the nearest snapshot, then replay the tail."""
+
+    handlers = {}   # record type -> fn(world, payload), for types added elsewhere
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshots = []   # (time, offset), in log order
+        self.end = 0.0
+        for offset, kind, t, _ in read_session_log(path, payloads=False):
+            if kind == EV_SNAPSHOT:
+                self.snapshots.append((t, offset))
+            self.end = t
+
+    def seek(self, world, t=None):
+        if t is None:
+            t = self.end
+        i = bisect_right(self.snapshots, (t, float("inf"))) - 1
+        if i < 0:
+            return
+        for _, kind, rt, payload in read_session_log(self.path, self.snapshots[i][1]):
+            if rt > t:
+                break
+            self.apply(world, kind, payload)
+
+    def apply(self, world, kind, payload):
+        if kind == EV_SNAPSHOT:
+            apply_session_snapshot(world, json.loads(zlib.decompress(payload)))
+        elif kind == EV_SCENE:
+            name = payload.decode("utf-8")
+            if name != current_scene and name in scene_store:
+                load_scene(name, world)
+        elif kind == EV_MOVE:
+            token_id, x, y = MOVE_RECORD.unpack(payload)
+            char = world.get_token(token_id)
+            if char is not None:
+                world.queue_move(char, [])
+                char.x, char.y = x, y
+                world.token_index.move(char)
+        elif kind == EV_SEGMENT:
+            index, ox, oy, active = SEGMENT_RECORD.unpack(payload)
+            if index < len(world.map.segments):
+                seg = world.map.segments[index]
+                seg.offset_x, seg.offset_y, seg.active = ox, oy, bool(active)
+                world.map.segment_changed(seg)
+        elif kind == EV_EXPLORED:
+            cx, cy = EXPLORED_RECORD.unpack_from(payload)
+            world.explored.chunks[(cx, cy)] = ExploredMask.decode_chunk(payload[EXPLORED_RECORD.size:])
+            world.explored.dirty.add((cx, cy))
+            world.explored.needs_repaint = True
+        elif kind == EV_DOOR:
+            x, y, south, state = DOOR_RECORD.unpack(payload)
+            doors = world.map.doors
+            door = doors.at(x, y, "S" if south else "E")
+            if state < 0:
+                if door is not None:
+                    doors.remove(door)
+            elif door is None:
+                doors.add(Door(x, y, "S" if south else "E", bool(state)))
+            else:
+                doors.set_open(door, bool(state))
+        elif kind == EV_TOKEN_ADD:
+            restore_token(world, json.loads(payload))
+        elif kind == EV_TOKEN_REMOVE:
+            world.remove_character(TOKEN_RECORD.unpack(payload)[0])
+        elif kind == EV_HP:
+            token_id, hp = HP_RECORD.unpack(payload)
+            char = world.get_token(token_id)
+            if char is not None:
+                char.hp = hp
+        elif kind in self.handlers:
+            self.handlers[kind](world, payload)
+
+
+def apply_session_snapshot(world, data):
+    if data["scene"] != current_scene and data["scene"] in scene_store:
+        load_scene(data["scene"], world)
+
+    if data["tokens"] and isinstance(data["tokens"][0], list):
+        # Older logs only kept [id, x, y, hp] for tokens that already exist
+        data["tokens"] = [dict(token_record(world.get_token(token_id)), x=x, y=y, hp=hp)
+                          for token_id, x, y, hp in data["tokens"] if world.get_token(token_id)]
+    restore_tokens(world, data["tokens"])
+
+    for seg, (ox, oy, active) in zip(world.map.segments, data["segments"]):
+        seg.offset_x, seg.offset_y, seg.active = ox, oy, active
+        world.map.segment_changed(seg)
+
+    explored = ExploredMask()
+    for key, hexdata in data["explored"].items():
+        cx, cy = map(int, key.split(","))
+        explored.chunks[(cx, cy)] = ExploredMask.decode_chunk(bytes.fromhex(hexdata))
+    world.explored = explored
+
+    if "doors" in data:
+        world.map.doors.clear()
+        for x, y, side, is_open in data["doors"]:
+            world.map.doors.add(Door(x, y, side, is_open))
+
+    # State owned elsewhere goes back through the same handler as its records
+    for kind, state in data.get("records", {}).items():
+        if int(kind) in SessionReplay.handlers:
+            SessionReplay.handlers[int(kind)](world, json.dumps(state))
+
+
 segfolder=r"C:\Users\joshb\Documents\Virtual Tabletop\segments"
 seg=[]
 for i in range(len(os.listdir(segfolder))):
     seg.append(MapSegment(f"segments/room {i+1}.png", 70, 70, 0, 0, f"Segment {i+1}"))
     game_map.add_segment(seg[i])
 world = World(game_map)
-# Auto-load Default scene if exists
-scenes = load_all_scenes()
-if "VAULT" in scenes:
-    load_scene("VAULT", world)
+scene_store = SceneStore()
+session_log = SessionLog(new_session_path())
+world.session_log = session_log
+segment_watcher = SegmentWatcher(SEGMENT_FOLDER, 70, 70)
 
 # Characters
 edric = PlayerCharacter(43, 50, 100, 10, 14, 16, 25, 18, 14, "Edric Vale")
@@ -559,7 +2821,12 @@ world.add_characters(edric)
 world.add_characters(six)
 world.add_characters(npc)
 
+# Auto-load Default scene if exists
+if "VAULT" in scene_store:
+    load_scene("VAULT", world)
+
 current_turn_char = edric
+selected_token_id = edric.token_id
 
 
 # ------------------------------
@@ -587,16 +2854,10 @@ surface_height = view_height * tile_size
 player_surface = pygame.Surface((surface_width, surface_height))
 dm_surface = pygame.Surface((surface_width, surface_height))
 fog_surface = pygame.Surface((surface_width, surface_height), pygame.SRCALPHA)
-WORLD_PX_WIDTH  = world.map.width  * tile_size
-WORLD_PX_HEIGHT = world.map.height * tile_size
-
-explored_surface = pygame.Surface((WORLD_PX_WIDTH, WORLD_PX_HEIGHT), pygame.SRCALPHA)
-explored_surface.fill((0, 0, 0, 255))   # full unexplored
-
-
-
-
-
+fog_key = None      # inputs of the last fog pass; the pass is skipped while they hold
+fog_revision = 0    # bumped whenever fog_surface is drawn on
+# Explored memory, allocated per world chunk as it is needed
+explored_layer = ExploredLayer(tile_size)
 
 
 player_camera = Camera(0, 0, view_width, view_height, world)
@@ -605,6 +2866,8 @@ dm_camera     = Camera(0, 0, view_width, view_height, world)
 
 
 renderer = Renderer(tile_size, tile_size)
+player_worker = ViewWorker(renderer, player_surface, "player view")
+dm_worker = ViewWorker(renderer, dm_surface, "DM view")
 
 # Windows
 player_win = tk.Toplevel()
@@ -641,6 +2904,11 @@ group_btn.pack(fill="x")
 next_btn = tk.Button(init_frame, text="Next Turn")
 next_btn.pack(fill="x")
 
+encounter_count = tk.Spinbox(init_frame, from_=1, to=200, width=5)
+encounter_count.pack(fill="x")
+encounter_btn = tk.Button(init_frame, text="Spawn Goblins")
+encounter_btn.pack(fill="x")
+
 init_listbox = tk.Listbox(init_frame)
 init_listbox.pack(fill="both", expand=True, pady=5)
 player_label = tk.Label(player_win)
@@ -667,14 +2935,14 @@ def refresh_scene_list():
     menu = scene_dropdown["menu"]
     menu.delete(0, "end")
 
-    scenes = load_all_scenes()
-    for name in scenes.keys():
+    for name in scene_store.names():
         menu.add_command(label=name, command=lambda v=name: scene_var.set(v))
 
 refresh_scene_list()
 def load_selected_scene():
     name = scene_var.get()
     load_scene(name, world)
+    session_log.log_scene(world, current_scene)
 
 
 def save_current_scene():
@@ -705,11 +2973,10 @@ def create_new_scene():
 
 def delete_scene():
     name = scene_var.get()
-    scenes = load_all_scenes()
-
-    if name in scenes:
-        del scenes[name]
-        save_all_scenes(scenes)
+    scene_store.delete(name)
+    if name == current_scene:
+        # Its explored chunks are gone too; a new scene of that name must get all of them
+        world.explored.saved_as = None
 
     scene_var.set("Default")
     refresh_scene_list()
@@ -734,72 +3001,160 @@ def save_layout_hotkey(event=None):
 
 dm_win.bind("<s>", save_layout_hotkey)
 dm_win.bind("<S>", save_layout_hotkey)
+init_view = InitiativeListView(init_listbox)
 def refresh_init_list():
-    init_listbox.delete(0, "end")
-
-    for i, entry in enumerate(initiative_order):
-        marker = "→ " if i == current_initiative_index and combat_active else ""
-        init_listbox.insert("end", f"{marker}{entry.name} ({entry.initiative})")
-def sort_initiative():
-    global initiative_order
-    initiative_order.sort(key=lambda e: e.initiative, reverse=True)
+    init_view.sync(initiative, combat_active)
+def add_to_initiative(entry):
+    initiative.add(entry)
     refresh_init_list()
+    log_initiative()
 def toggle_combat():
     global combat_active
     combat_active = not combat_active
+    if combat_active:
+        initiative.current = 0   # adds before combat move the marker; start from the top
     combat_btn.config(text="End Combat" if combat_active else "Start Combat")
+    refresh_init_list()
+    log_initiative()
+def initiative_state():
+    return {
+        "order": [[e.name, list(e.member_ids), e.initiative, e.dex_mod] for e in initiative.entries],
+        "index": initiative.current,
+        "active": combat_active,
+    }
+def log_initiative():
+    session_log.log_initiative(initiative_state())
+def replay_initiative(world, payload):
+    global combat_active
+    state = json.loads(payload)
+    for entry in initiative.entries:
+        entry.release(world)
+    initiative.clear()
+    for name, ids, init, dex_mod in state["order"]:
+        initiative.add(InitiativeEntry(name, ids, init, dex_mod))
+    initiative.current = state["index"]
+    combat_active = state["active"]
+    combat_btn.config(text="End Combat" if combat_active else "Start Combat")
+    refresh_init_list()
+SessionReplay.handlers[EV_INITIATIVE] = replay_initiative
+SessionLog.snapshot_records[EV_INITIATIVE] = initiative_state
 combat_btn.config(command=toggle_combat)
 def add_selected_to_init():
-    char = world.characters[selected_char_index]
+    char = world.get_token(selected_token_id)
+    if char is None:
+        return
 
-    roll = 10  # placeholder, you can roll later
-    entry = InitiativeEntry(char.name, [char], roll)
+    roll = roll_initiative([char.initiative_mod])[0]
+    entry = InitiativeEntry(char.name, [char.token_id], roll, char.initiative_mod)
 
-    initiative_order.append(entry)
-    sort_initiative()
+    add_to_initiative(entry)
 def add_group_to_init():
     selected = []
+    dex_mod = None
 
     # Example: all NPCs
     for c in world.characters:
         if not isinstance(c, PlayerCharacter):
-            selected.append(c)
+            selected.append(c.token_id)
+            dex_mod = c.initiative_mod if dex_mod is None else max(dex_mod, c.initiative_mod)
 
     if not selected:
         return
 
-    roll = 10
-    entry = InitiativeEntry("Enemy Group", selected, roll)
-
-    initiative_order.append(entry)
-    sort_initiative()
+    roll = roll_initiative([dex_mod])[0]
+    entry = InitiativeEntry("Enemy Group", selected, roll, dex_mod)
+
+    add_to_initiative(entry)
+def add_encounter(spawns, x, y, group_by="kind"):
+    """Spawn [(template, count), ...] around (x, y) and add them all to initiative at once."""
+    chars = []
+    for template, count in spawns:
+        chars += spawn_encounter(world, template, count, x, y)
+    if not chars:
+        return []
+    initiative.add_many(encounter_entries(chars, group_by))
+    refresh_init_list()
+    log_initiative()
+    return chars
+def spawn_encounter_from_ui():
+    try:
+        count = int(encounter_count.get())
+    except ValueError:
+        print("Encounter size must be a whole number")
+        return
+    if count < 1:
+        return
+    # Around the selected token, or the middle of the DM view
+    char = world.get_token(selected_token_id)
+    if char is not None:
+        x, y = char.x, char.y
+    else:
+        x, y = dm_camera.x + dm_camera.width // 2, dm_camera.y + dm_camera.height // 2
+    add_encounter([(GOBLIN, count)], x, y)
 def next_turn():
-    global current_initiative_index
-
-    if not initiative_order:
+    if not initiative:
         return
 
-    current_initiative_index = (current_initiative_index + 1) % len(initiative_order)
+    initiative.next_turn()
     refresh_init_list()
+    log_initiative()
 next_btn.config(command=next_turn)
+encounter_btn.config(command=spawn_encounter_from_ui)
 add_btn.config(command=add_selected_to_init)
 group_btn.config(command=add_group_to_init)
 # ------------------------------
 # Fog-of-War (persistent)
 # ------------------------------
+def reset_fog():
+    # Black out the screen-space fog; the next fog pass redraws it
+    global fog_key, fog_revision
+    fog_surface.fill((0, 0, 0, 255))
+    fog_key = None
+    fog_revision += 1
+
+
+def repaint_explored(explored):
+    # Rebuild the explored chunks from the tile mask (e.g. after loading a scene)
+    explored_layer.clear()
+    for x, y, length in explored.row_runs():
+        explored_layer.reveal_tiles(x, y, length)
+    explored.needs_repaint = False
+
+
 def update_fog_of_war(world, camera):
     # Reset only CURRENT fog (not explored memory)
-
-    if combat_active and initiative_order:
-        chars = initiative_order[current_initiative_index].members
+    global fog_key, fog_revision
+    explored = world.explored
+    if explored.needs_repaint:
+        repaint_explored(explored)
+        fog_key = None
+
+    min_x, min_y, max_x, max_y = world.map.bounds
+    grid = world.map.segment_grid
+    lights = world.lights
+    lights.update()
+
+    if combat_active and initiative:
+        chars = initiative.active.members(world)
     else:
-        chars = [c for c in world.characters if isinstance(c, PlayerCharacter)]
+        chars = world.party.members
+    chars = [c for c in chars if isinstance(c, PlayerCharacter)]
+
+    # Nothing the pass reads has changed: the fog and explored chunks are
+    # already drawn, and re-revealing would copy every chunk a frame holds
+    key = (grid.version_counter, lights.revision, lights.ambient, camera.x, camera.y, camera.tile_px,
+           tuple((c.x, c.y, c.vision_radius, c.vision_type, c.darkvision) for c in chars))
+    if key == fog_key:
+        return
+    fog_key = key
+    fog_revision += 1
+    world.visible_tiles = set()
 
     for c in chars:
-        if not isinstance(c, PlayerCharacter):
-            continue
 
         radius_tiles = c.vision_radius
+        sees_all = lights.ambient != LIGHT_DARK   # skip per-tile light checks by day
+        lit_beyond = []   # lit tiles seen past a dark stretch of a ray
 
         # Player position in screen pixels
         cx = int(c.x * tile_size + tile_size // 2)
@@ -817,49 +3172,40 @@ def update_fog_of_war(world, camera):
             x, y = cx, cy
             last_x, last_y = cx, cy
             prev_tx, prev_ty = None, None
+            in_dark = False
 
             for step in range(radius_px):
                 px = int(x)
                 py = int(y)
 
+                # Pixel → world tile
+                tx = px // tile_size
+                ty = py // tile_size
+
                 # Outside WORLD
-                if px < 0 or py < 0 or px >= WORLD_PX_WIDTH or py >= WORLD_PX_HEIGHT:
+                if tx < min_x or ty < min_y or tx >= max_x or ty >= max_y:
                     break
 
-                # Pixel → world tile
-                tx = int(px / tile_size)
-                ty = int(py / tile_size)
-
                 tile = world.map.get_tile(tx, ty)
                 if tile is None:
                     break
 
-                if prev_tx is not None:
-                    dx_tile = tx - prev_tx
-                    dy_tile = ty - prev_ty
+                if prev_tx is not None and (tx != prev_tx or ty != prev_ty):
                     prev_tile = world.map.get_tile(prev_tx, prev_ty)
-
-                    def blocks(edge):
-                        return edge is True
-
-                    # Horizontal / vertical edge check
-                    if dx_tile == 1 and (blocks(tile.blocked_edges["W"]) or blocks(prev_tile.blocked_edges["E"])):
-                        break
-                    if dx_tile == -1 and (blocks(tile.blocked_edges["E"]) or blocks(prev_tile.blocked_edges["W"])):
-                        break
-                    if dy_tile == 1 and (blocks(tile.blocked_edges["N"]) or blocks(prev_tile.blocked_edges["S"])):
-                        break
-                    if dy_tile == -1 and (blocks(tile.blocked_edges["S"]) or blocks(prev_tile.blocked_edges["N"])):
+                    if world.map.sight_blocked(prev_tx, prev_ty, prev_tile, tx, ty, tile):
                         break
 
-                    # Corner blocking: if moving diagonally, stop if either adjacent orthogonal tile blocks the corner
-                    if dx_tile != 0 and dy_tile != 0:
-                        neighbor_x = world.map.get_tile(prev_tx + dx_tile, prev_ty)
-                        neighbor_y = world.map.get_tile(prev_tx, prev_ty + dy_tile)
-                        if (neighbor_x and not neighbor_x.walkable) or (neighbor_y and not neighbor_y.walkable):
-                            break
-
-                last_x, last_y = px, py
+                if tx != prev_tx or ty != prev_ty:
+                    # Only tiles with light (or in darkvision) are seen; darkness doesn't block the ray
+                    if sees_all or lights.lit_for(c, tx, ty):
+                        explored.mark(tx, ty)
+                        world.visible_tiles.add((tx, ty))
+                        if in_dark:
+                            lit_beyond.append((tx, ty))
+                    else:
+                        in_dark = True
+                if not in_dark:
+                    last_x, last_y = px, py
 
                 # Stop at solid tiles (unless special vision)
                 if not tile.walkable and c.vision_type not in ("true_sight", "blindsight"):
@@ -880,9 +3226,25 @@ def update_fog_of_war(world, camera):
             poly = [(cx, cy)] + points
 
             # Convert world polygon → screen polygon
-            screen_poly = [(int(wx - camera.x * tile_size), int(wy - camera.y * tile_size)) for wx, wy in poly]
+            scale = camera.tile_px / tile_size
+            screen_poly = [(int((wx - camera.x * tile_size) * scale), int((wy - camera.y * tile_size) * scale))
+                           for wx, wy in poly]
             pygame.draw.polygon(fog_surface, (0, 0, 0, 0), screen_poly)
-            pygame.draw.polygon(explored_surface, (0, 0, 0, 0), poly)
+
+            # Only chunks under the polygon that actually hold map are touched
+            xs = [wx for wx, _ in poly]
+            ys = [wy for _, wy in poly]
+            keys = [key for key in grid.cell_keys(min(xs) // tile_size, min(ys) // tile_size,
+                                                  max(xs) // tile_size + 1, max(ys) // tile_size + 1)
+                    if key in grid.cells]
+            explored_layer.reveal_polygon(poly, keys)
+
+        # Lit patches beyond darkness are outside the polygon; reveal them tile by tile
+        for tx, ty in lit_beyond:
+            explored_layer.reveal_tiles(tx, ty, 1)
+            sx, sy = camera.world_to_screen(tx, ty)
+            fog_surface.fill((0, 0, 0, 0), pygame.Rect(sx * camera.tile_px, sy * camera.tile_px,
+                                                       camera.tile_px, camera.tile_px))
 
 
 
@@ -907,6 +3269,7 @@ def snap_to_walkable(char, world):
         tile = world.map.get_tile(x, y)
         if tile and tile.walkable:
             char.x, char.y = x, y
+            world.token_index.move(char)
             return
 
         for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
@@ -918,49 +3281,49 @@ def snap_to_walkable(char, world):
 
 SNAP_DISTANCE = 1  # tiles
 
-def snap_segment_to_others(seg, all_segments):
-    """Move seg so it snaps to the nearest segment edge if close enough"""
-    for other in all_segments:
-        if other == seg or not getattr(other, "active", True):
-            continue
+def snap_segment_to_others(seg, edge_index):
+    """Move seg so its borders snap to the nearest border of another segment.
+
+    Any border whose span overlaps (or nearly touches) seg's matching side
+    is a candidate, so segments can slide along each other rather than
+    only snapping at corners.
+    """
+    x0, x1 = seg.offset_x, seg.offset_x + seg.width
+    y0, y1 = seg.offset_y, seg.offset_y + seg.height
 
-        # Check all 4 edges: N, S, W, E
-        # Snap N to S
-        if abs(seg.offset_y - (other.offset_y + other.height)) <= SNAP_DISTANCE:
-            if abs(seg.offset_x - other.offset_x) <= SNAP_DISTANCE or \
-               abs(seg.offset_x + seg.width - (other.offset_x + other.width)) <= SNAP_DISTANCE:
-                seg.offset_y = other.offset_y + other.height
-
-        # Snap S to N
-        if abs((seg.offset_y + seg.height) - other.offset_y) <= SNAP_DISTANCE:
-            if abs(seg.offset_x - other.offset_x) <= SNAP_DISTANCE or \
-               abs(seg.offset_x + seg.width - (other.offset_x + other.width)) <= SNAP_DISTANCE:
-                seg.offset_y = other.offset_y - seg.height
-
-        # Snap W to E
-        if abs(seg.offset_x - (other.offset_x + other.width)) <= SNAP_DISTANCE:
-            if abs(seg.offset_y - other.offset_y) <= SNAP_DISTANCE or \
-               abs(seg.offset_y + seg.height - (other.offset_y + other.height)) <= SNAP_DISTANCE:
-                seg.offset_x = other.offset_x + other.width
-
-        # Snap E to W
-        if abs((seg.offset_x + seg.width) - other.offset_x) <= SNAP_DISTANCE:
-            if abs(seg.offset_y - other.offset_y) <= SNAP_DISTANCE or \
-               abs(seg.offset_y + seg.height - (other.offset_y + other.height)) <= SNAP_DISTANCE:
-                seg.offset_x = other.offset_x - seg.width
+    best_dx = None
+    for edge_x in (x0, x1):
+        for x, ey0, ey1, other in edge_index.near_vertical(edge_x, SNAP_DISTANCE):
+            if other is seg or ey1 < y0 - SNAP_DISTANCE or ey0 > y1 + SNAP_DISTANCE:
+                continue
+            if best_dx is None or abs(x - edge_x) < abs(best_dx):
+                best_dx = x - edge_x
+
+    best_dy = None
+    for edge_y in (y0, y1):
+        for y, ex0, ex1, other in edge_index.near_horizontal(edge_y, SNAP_DISTANCE):
+            if other is seg or ex1 < x0 - SNAP_DISTANCE or ex0 > x1 + SNAP_DISTANCE:
+                continue
+            if best_dy is None or abs(y - edge_y) < abs(best_dy):
+                best_dy = y - edge_y
+
+    if best_dx:
+        seg.offset_x += best_dx
+    if best_dy:
+        seg.offset_y += best_dy
 
 # ------------------------------
 # Player camera focus
 # ------------------------------
 def get_player_focus(world, active_char=None):
-    pcs = [c for c in world.characters if isinstance(c, PlayerCharacter)]
-    if not pcs:
+    party = world.party
+    if not party:
         return 0, 0
 
     focus = []
 
-    for c in pcs:
-        if c == active_char or c == world.characters[selected_char_index]:
+    for c in party.members:
+        if c == active_char or c.token_id == selected_token_id:
             focus.append(c)
             continue
 
@@ -969,16 +3332,79 @@ def get_player_focus(world, active_char=None):
             focus.append(c)
 
     if not focus:
-        return pcs[0].x, pcs[0].y
+        first = next(iter(party.members))
+        return first.x, first.y
 
+    # Usually the whole party is in frame; its centroid is already known
+    if len(focus) == len(party):
+        return party.centroid()
     x = sum(c.x for c in focus) // len(focus)
     y = sum(c.y for c in focus) // len(focus)
     return x, y
 
 
+def focus_player_camera(group, x, y):
+    # Centre on (x, y), or fit the whole group when FIT_PLAYER_FOCUS is on
+    if FIT_PLAYER_FOCUS and len(group) > 1:
+        if player_camera.fit(*group.bbox()):
+            reset_fog()
+    else:
+        player_camera.center_on(x, y)
+
+
 # ------------------------------
 # DM Controls
 # ------------------------------
+def screen_to_world_point(event, camera):
+    # Like screen_to_tile, but keeps the position inside the tile
+    ox, oy = get_image_offset(dm_label, dm_surface)
+    return (camera.x + (event.x - ox) / camera.tile_px,
+            camera.y + (event.y - oy) / camera.tile_px)
+
+
+def cycle_aoe_shape(event=None):
+    global aoe_shape, aoe_preview
+    shapes = [None] + list(AOE_SIZES)
+    aoe_shape = shapes[(shapes.index(aoe_shape) + 1) % len(shapes)]
+    aoe_preview = None
+    print("Area tool:", aoe_shape or "off")
+
+
+def aoe_start(event):
+    global aoe_preview
+    if aoe_shape is None:
+        return
+    x, y = screen_to_world_point(event, dm_camera)
+    if aoe_shape in ("sphere", "cube"):
+        x, y = round(x), round(y)   # spheres and cubes start on grid intersections
+    aoe_preview = AreaTemplate(aoe_shape, x, y, AOE_SIZES[aoe_shape])
+
+
+def aoe_drag(event):
+    if aoe_preview is None:
+        return
+    x, y = screen_to_world_point(event, dm_camera)
+    if aoe_preview.shape in ("sphere", "cube"):
+        aoe_preview.x, aoe_preview.y = round(x), round(y)
+    else:
+        aoe_preview.direction = math.degrees(math.atan2(y - aoe_preview.y, x - aoe_preview.x))
+
+
+def aoe_release(event):
+    global aoe_preview
+    if aoe_preview is None:
+        return
+    names = [c.name for c in aoe_preview.affected(world)]
+    print(f"{aoe_preview.shape.title()} hits {len(names)}: {', '.join(names)}")
+    aoe_preview = None
+
+
+dm_label.bind("<Control-Button-1>", aoe_start)
+dm_label.bind("<Control-B1-Motion>", aoe_drag)
+dm_label.bind("<Control-ButtonRelease-1>", aoe_release)
+dm_win.bind("<a>", cycle_aoe_shape)
+
+
 def start_drag(event):
     global dragged_segment, seg_drag_offset
 
@@ -988,13 +3414,11 @@ def start_drag(event):
         if wx is None:
             return
 
-        for seg in world.map.segments:
-            if (seg.offset_x <= wx < seg.offset_x + seg.width and
-                seg.offset_y <= wy < seg.offset_y + seg.height):
-
-                dragged_segment = seg
-                seg_drag_offset = (wx - seg.offset_x, wy - seg.offset_y)
-                return
+        seg = world.map.segment_at(wx, wy, active_only=False)
+        if seg is not None:
+            dragged_segment = seg
+            seg_drag_offset = (wx - seg.offset_x, wy - seg.offset_y)
+            return
 
     # Normal camera drag
     dm_camera.dragging = True
@@ -1011,9 +3435,15 @@ def drag(event):
             return
 
         # Move segment so cursor stays at same relative offset
+        old = (dragged_segment.offset_x, dragged_segment.offset_y)
         dragged_segment.offset_x = wx - seg_drag_offset[0]
         dragged_segment.offset_y = wy - seg_drag_offset[1]
 
+        # Snap to others
+        snap_segment_to_others(dragged_segment, world.map.edge_index)
+        if (dragged_segment.offset_x, dragged_segment.offset_y) == old:
+            return   # still on the same tile: nothing to re-index or redraw
+        world.map.segment_changed(dragged_segment)
         return
 
 
@@ -1022,28 +3452,20 @@ def drag(event):
         dx_pixels = dm_camera.drag_start[0] - event.x
         dy_pixels = dm_camera.drag_start[1] - event.y
 
-        dx_tiles = int(round(dx_pixels / tile_size))
-        dy_tiles = int(round(dy_pixels / tile_size))
+        dx_tiles = int(round(dx_pixels / dm_camera.tile_px))
+        dy_tiles = int(round(dy_pixels / dm_camera.tile_px))
 
         dm_camera.x = dm_camera.cam_start[0] + dx_tiles
         dm_camera.y = dm_camera.cam_start[1] + dy_tiles
         dm_camera.clamp()
 
-    if segment_manager_mode and dragged_segment:
-        wx, wy = screen_to_tile(event, dm_camera)
-        if wx is None:
-            return
-        dragged_segment.offset_x = wx - seg_drag_offset[0]
-        dragged_segment.offset_y = wy - seg_drag_offset[1]
-
-        # Snap to others
-        snap_segment_to_others(dragged_segment, world.map.segments)
-
 
 def end_drag(event):
     global dragged_segment
 
     if segment_manager_mode:
+        if dragged_segment is not None:
+            session_log.log_segment(world, dragged_segment)
         dragged_segment = None
         return
 
@@ -1071,15 +3493,16 @@ def screen_to_tile(event, camera):
         return None, None
 
     # Pixel → screen tile
-    sx = int(mx / tile_size)
-    sy = int(my / tile_size)
+    sx = int(mx / camera.tile_px)
+    sy = int(my / camera.tile_px)
 
     # Screen tile → world tile
     wx, wy = camera.screen_to_world(sx, sy)
 
     # Clamp
-    wx = max(0, min(wx, world.map.width  - 1))
-    wy = max(0, min(wy, world.map.height - 1))
+    min_x, min_y, max_x, max_y = world.map.bounds
+    wx = max(min_x, min(wx, max_x - 1))
+    wy = max(min_y, min(wy, max_y - 1))
 
     return wx, wy
 
@@ -1087,7 +3510,9 @@ def screen_to_tile(event, camera):
 
 
 def dm_click_move(event):
-    char = world.characters[selected_char_index]
+    char = world.get_token(selected_token_id)
+    if char is None:
+        return
 
     # Ensure character is on a valid tile first
     snap_to_walkable(char, world)
@@ -1126,34 +3551,74 @@ def dm_click_move(event):
         else:
             break   # hit wall or edge → stop cleanly
 
-    char.move_queue = path
+    world.queue_move(char, path)
 
 
 
+def dm_door_click(event, remove=False):
+    # Shift-click: add a door on the nearest edge of the tile, or open/close the one there
+    wx, wy = screen_to_tile(event, dm_camera)
+    if wx is None:
+        return
+    ox, oy = get_image_offset(dm_label, dm_surface)
+    fx = (event.x - ox) / dm_camera.tile_px % 1
+    fy = (event.y - oy) / dm_camera.tile_px % 1
+    side = min((fy, "N"), (1 - fy, "S"), (fx, "W"), (1 - fx, "E"))[1]
+
+    doors = world.map.doors
+    door = doors.at(wx, wy, side)
+    if remove:
+        if door is not None:
+            doors.remove(door)
+            session_log.log_door(door, removed=True)
+        return
+    if door is None:
+        door = doors.add(Door(wx, wy, side))
+    else:
+        doors.toggle(door)
+    session_log.log_door(door)
+    print(f"Door at {door.edge}: {'open' if door.is_open else 'closed'}")
+
+
+dm_label.bind("<Shift-Button-1>", dm_door_click)
+dm_label.bind("<Shift-Button-3>", lambda e: dm_door_click(e, remove=True))
+
+
 def dm_select_character(event):
-    global selected_char_index
+    global selected_token_id
 
-    for i, char in enumerate(world.characters):
-        sx, sy = dm_camera.world_to_screen(char.x, char.y)
-        px = sx * tile_size + tile_size // 2
-        py = sy * tile_size + tile_size // 2
-        radius = max(6, tile_size // 3)
+    tile_px = dm_camera.tile_px
+    radius = max(6, tile_px // 3)
+
+    # Only tokens on the clicked tile (or a neighbour, for big radii) can be hit
+    wx, wy = dm_camera.screen_to_world(event.x // tile_px, event.y // tile_px)
+    reach = radius // tile_px + 1
+    candidates = world.token_index.in_rect(wx - reach, wy - reach, wx + reach, wy + reach)
 
+    hits = []
+    for char in candidates:
+        sx, sy = dm_camera.world_to_screen(char.x, char.y)
+        px = sx * tile_px + tile_px // 2
+        py = sy * tile_px + tile_px // 2
 
         if (event.x - px)**2 + (event.y - py)**2 <= radius**2:
-            selected_char_index = i
-            break
+            hits.append(char)
+
+    if hits:
+        # Oldest token wins when tokens overlap
+        selected_token_id = min(c.token_id for c in hits)
 def dm_toggle_segment(event):
     if not segment_manager_mode:
         return
     wx, wy = screen_to_tile(event, dm_camera)
     if wx is None:
         return
-    for seg in world.map.segments:
-        if seg.offset_x <= wx < seg.offset_x + seg.width and seg.offset_y <= wy < seg.offset_y + seg.height:
-            seg.active = not seg.active
-            print(f"{seg.name} active: {seg.active}")
-            break
+    seg = world.map.segment_at(wx, wy, active_only=False)
+    if seg is not None:
+        seg.active = not seg.active
+        world.map.segment_changed(seg)
+        session_log.log_segment(world, seg)
+        print(f"{seg.name} active: {seg.active}")
 
 
 dm_label.bind("<Button-3>", dm_toggle_segment)
@@ -1164,38 +3629,244 @@ dm_label.bind("<Button-3>", dm_click_move)
 dm_label.bind("<Button-2>", dm_select_character)
 
 
+def dm_zoom(event):
+    # Windows/macOS report wheel delta, X11 sends Button-4 / Button-5
+    if getattr(event, "delta", 0):
+        dm_camera.zoom_step(1 if event.delta > 0 else -1)
+    else:
+        dm_camera.zoom_step(1 if event.num == 4 else -1)
+
+
+def player_zoom(steps):
+    player_camera.zoom_step(steps)
+    # Fog is drawn in screen space at the player camera's zoom
+    reset_fog()
+
+
+dm_label.bind("<MouseWheel>", dm_zoom)
+dm_label.bind("<Button-4>", dm_zoom)
+dm_label.bind("<Button-5>", dm_zoom)
+dm_win.bind("<bracketright>", lambda e: player_zoom(1))
+dm_win.bind("<bracketleft>", lambda e: player_zoom(-1))
+
+
+def toggle_torch(event=None):
+    # Selected token picks up or puts down a torch
+    char = world.get_token(selected_token_id)
+    if char is None:
+        return
+    carried = world.lights.carried_by(char.token_id)
+    for light in carried:
+        world.lights.remove(light)
+    if not carried:
+        world.lights.add(LightSource(char.x, char.y, *TORCH_RADII, carrier=char.token_id))
+    print(f"{char.name} torch: {not carried}")
+
+
+def delete_selected_token(event=None):
+    global selected_token_id
+    char = world.remove_character(selected_token_id)
+    if char is None:
+        return
+    selected_token_id = None
+    print(f"Removed {char.name}")
+    # Entries left without tokens drop out of the order
+    emptied = [entry for entry in initiative.entries if not entry.members(world)]
+    for entry in emptied:
+        entry.release(world)
+        initiative.remove(entry)
+    if emptied:
+        refresh_init_list()
+        log_initiative()
+
+
+def toggle_darkness(event=None):
+    lights = world.lights
+    lights.ambient = LIGHT_BRIGHT if lights.ambient == LIGHT_DARK else LIGHT_DARK
+    print("Ambient light:", "dark" if lights.ambient == LIGHT_DARK else "bright")
+
+
+dm_win.bind("<t>", toggle_torch)
+dm_win.bind("<n>", toggle_darkness)
+dm_win.bind("<Delete>", delete_selected_token)
+
+
 # ------------------------------
 # Convert pygame → tkinter
 # ------------------------------
-def pygame_to_tk(surf):
-    data = pygame.image.tostring(surf, "RGB")
+def pygame_to_tk(surf, data=None):
+    if data is None:
+        data = pygame.image.tostring(surf, "RGB")
     img = Image.frombytes("RGB", surf.get_size(), data)
     return ImageTk.PhotoImage(img)
 
 
 
+# ------------------------------
+# Remote player view
+# ------------------------------
+class ViewPublisher:
+    """Sends remote players the changes to what they may see: explored map and visible tokens."""
+
+    def __init__(self, server):
+        self.server = server
+        self.reset()
+
+    def reset(self):
+        self.scene = None
+        self.explored = None
+        self.segments = {}   # seg id -> (offset_x, offset_y) of the segments clients know of
+        self.tiles = {}      # seg id -> (seg.version, layout, explored revisions) sent
+        self.tokens = {}     # token id -> (x, y)
+        self.chunks = {}     # (cx, cy) -> revision sent
+        self.revision = None # explored.revision last published
+
+    @staticmethod
+    def explored_keys(seg):
+        return [(cx, cy)
+                for cy in range(seg.offset_y // EXPLORED_CHUNK, (seg.offset_y + seg.height - 1) // EXPLORED_CHUNK + 1)
+                for cx in range(seg.offset_x // EXPLORED_CHUNK, (seg.offset_x + seg.width - 1) // EXPLORED_CHUNK + 1)]
+
+    @staticmethod
+    def tile_bytes(grid, x0, y0, width, height, explored):
+        # Unexplored tiles are left 0 so the walls behind the fog stay hidden.
+        # Runs on the server loop: grid is never edited in place, explored is a copy
+        out = bytearray(width * height)
+        i = 0
+        for ty, row in enumerate(grid.tiles[:height]):
+            for tx, tile in enumerate(row[:width]):
+                if not explored.is_explored(x0 + tx, y0 + ty):
+                    i += 1
+                    continue
+                value = TILE_WALKABLE if tile.walkable else 0
+                for side, bit in TILE_EDGES.items():
+                    if tile.blocked_edges[side] is True:
+                        value |= bit
+                out[i] = value
+                i += 1
+        return bytes(out)
+
+    def publish(self, world, scene_name):
+        records = []
+        if scene_name != self.scene or world.explored is not self.explored:
+            self.reset()
+            self.scene = scene_name
+            self.explored = world.explored
+            records += [(RESET,), (SCENE, scene_name)]
+
+        explored = world.explored
+        explored_changed = explored.revision != self.revision
+        for seg_id, seg in enumerate(world.map.segments):
+            known = seg_id in self.segments
+            # Explored only grows, so a segment already announced stays shown while active
+            if not seg.active or not (known or any(key in explored.chunks for key in self.explored_keys(seg))):
+                if known:
+                    del self.segments[seg_id]
+                    self.tiles.pop(seg_id, None)
+                    records.append((SEGMENT_REMOVE, seg_id))
+                continue
+            layout = (seg.offset_x, seg.offset_y)
+            if self.segments.get(seg_id) != layout:
+                self.segments[seg_id] = layout
+                records.append((SEGMENT, seg_id, seg.offset_x, seg.offset_y, seg.width, seg.height, 1))
+            sent = self.tiles.get(seg_id)
+            if sent is not None and sent[:2] == (seg.version, layout) and not explored_changed:
+                continue
+            # Re-send when exploring reaches the segment, not on every explored tile
+            keys = self.explored_keys(seg)
+            stamp = (seg.version, layout, [explored.revisions.get(key, 0) for key in keys])
+            if sent != stamp:
+                self.tiles[seg_id] = stamp
+                records.append((SEGMENT_TILES, seg_id, partial(self.tile_bytes, seg.map, seg.offset_x, seg.offset_y,
+                                                               seg.width, seg.height, explored.copy(keys))))
+
+        # Only occupied tiles matter; the set intersection walks the smaller side
+        buckets = world.token_index.buckets
+        visible = {char.token_id: (char.x, char.y) for char in world.party.members}
+        for pos in world.visible_tiles & buckets.keys():
+            for char in buckets[pos]:
+                visible[char.token_id] = pos
+        for token_id, pos in visible.items():
+            if self.tokens.get(token_id) != pos:
+                char = world.tokens[token_id]
+                records.append((TOKEN, token_id, pos[0], pos[1], int(isinstance(char, PlayerCharacter))))
+        for token_id in self.tokens.keys() - visible.keys():
+            records.append((TOKEN_REMOVE, token_id))
+        self.tokens = visible
+
+        if explored_changed:
+            self.revision = explored.revision
+            for key, revision in explored.revisions.items():
+                if self.chunks.get(key) != revision:
+                    self.chunks[key] = revision
+                    records.append((EXPLORED, key[0], key[1], ExploredMask.encode_chunk(explored.chunks[key])))
+            # Chunks loaded with the scene have no revision yet
+            for key in explored.chunks.keys() - self.chunks.keys():
+                self.chunks[key] = explored.revisions.get(key, 0)
+                records.append((EXPLORED, key[0], key[1], ExploredMask.encode_chunk(explored.chunks[key])))
+
+        self.server.publish(records)
+
+
+view_server = None
+view_publisher = None
+if SERVE_PLAYER_VIEW:
+    view_server = PlayerViewServer(PLAYER_VIEW_HOST, PLAYER_VIEW_PORT).start()
+    view_publisher = ViewPublisher(view_server)
+    print(f"Serving player view on {PLAYER_VIEW_HOST}:{view_server.port}")
+
+frame_streamer = None
+if STREAM_PLAYER_FRAMES:
+    frame_streamer = FrameStreamServer(PLAYER_VIEW_HOST, PLAYER_STREAM_PORT).start()
+    print(f"Streaming player view at http://{PLAYER_VIEW_HOST}:{frame_streamer.port}/")
+
+
 # ------------------------------
 # Update loop
 # ------------------------------
+last_update_time = time.perf_counter()
+
 def update():
-    for char in world.characters:
-        char.update_position(world)
-        snap_to_walkable(char, world)
+    global last_update_time
+
+    segment_watcher.apply(world)
 
-    if combat_active and initiative_order:
-        active_entry = initiative_order[current_initiative_index]
-        px, py = active_entry.average_position()
+    now = time.perf_counter()
+    world.update_positions(now - last_update_time)
+    last_update_time = now
+
+    if combat_active and initiative:
+        active_entry = initiative.active
+        px, py = active_entry.average_position(world)
+        focus_player_camera(active_entry.group(world), px, py)
     else:
         px, py = get_player_focus(world, current_turn_char)
-    player_camera.center_on(px, py)
+        focus_player_camera(world.party, px, py)
     # Update fog before drawing
     update_fog_of_war(world, player_camera)
+    session_log.tick(world, current_scene)
+    if view_publisher is not None:
+        view_publisher.publish(world, current_scene)
+
+    # Both views paint on their workers from frames snapshotted here, so
+    # Tk events handled meanwhile cannot change what ends up on screen
+    player_worker.submit(renderer.prepare(world, player_camera, dm_view=False))
+    dm_worker.submit(renderer.prepare(world, dm_camera, dm_view=True))
+    present()
 
-    renderer.draw(player_surface, world, player_camera, dm_view=False)
-    renderer.draw(dm_surface, world, dm_camera, dm_view=True)
 
-    player_img = pygame_to_tk(player_surface)
-    dm_img = pygame_to_tk(dm_surface)
+def present():
+    # Keep Tk responsive until both frames are painted, then show them together
+    if not (player_worker.done.is_set() and dm_worker.done.is_set()):
+        player_win.after(1, present)
+        return
+
+    player_rgb = player_worker.result()
+    dm_rgb = dm_worker.result()
+    if frame_streamer is not None:
+        frame_streamer.submit(player_rgb, player_surface.get_size())   # encoded on its own thread
+    player_img = pygame_to_tk(player_surface, player_rgb)
+    dm_img = pygame_to_tk(dm_surface, dm_rgb)
 
     player_label.img = player_img
     player_label.config(image=player_img)
@@ -1209,5 +3880,23 @@ def update():
 # ------------------------------
 # Start
 # ------------------------------
+# Pick up where a crashed or closed session left off
+if "--resume" in sys.argv:
+    last_session = latest_session_path(exclude=session_log.path)
+    if last_session is not None:
+        SessionReplay(last_session).seek(world)
+        print(f"Resumed from {last_session}")
+
 update()
 player_win.mainloop()
+if current_scene in scene_store:   # a deleted or never-saved scene would leave orphan blobs
+    save_scene_state(current_scene, world)
+scene_store.close()
+session_log.snapshot(world, current_scene)
+session_log.close()
+player_worker.stop()
+dm_worker.stop()
+if view_server is not None:
+    view_server.stop()
+if frame_streamer is not None:
+    frame_streamer.stop()
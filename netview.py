@@ -0,0 +1,579 @@
+# ==============================
+# Virtual Tabletop – Remote Player View
+# ==============================
+#
+# Streams the player view to other machines on the local network.
+# The DM app runs PlayerViewServer (asyncio, on its own thread) and
+# publishes record deltas each tick; remote players run this file as a
+# reference client:
+#
+#     python netview.py <host> [port]
+#
+# Devices that only have a browser use FrameStreamServer instead, which
+# serves the rendered player view as a tiled image stream at
+# http://<host>:<port>/.
+
+import abc
+import asyncio
+import socket
+import struct
+import sys
+import threading
+import zlib
+
+DEFAULT_PORT = 8765
+CLIENT_QUEUE_SIZE = 64   # frames a slow client may fall behind before it is resynced
+STREAM_PORT = 8766
+STREAM_TILE = 64         # pixel size of the tiles a rendered frame is split into
+
+# ------------------------------
+# Protocol
+# ------------------------------
+# A frame is a 4-byte big-endian length followed by that many bytes of
+# records. Each record is a 1-byte type followed by its fields.
+RESET = 0          # client drops everything it knows (sent before a snapshot)
+SCENE = 1          # name
+SEGMENT = 2        # seg id, offset x/y, width, height, active
+SEGMENT_TILES = 3  # seg id, one byte per tile (see TILE_* bits)
+TOKEN = 4          # token id, x, y, is player
+TOKEN_REMOVE = 5   # token id
+EXPLORED = 6       # chunk x/y, run-length encoded chunk bits
+SEGMENT_REMOVE = 7 # seg id
+
+TILE_WALKABLE = 1
+TILE_EDGES = {"N": 2, "S": 4, "E": 8, "W": 16}
+
+FRAME_HEADER = struct.Struct(">I")
+SEGMENT_FMT = struct.Struct(">HiiHHB")
+TOKEN_FMT = struct.Struct(">IiiB")
+EXPLORED_FMT = struct.Struct(">iiH")
+
+
+def encode_records(records):
+    out = bytearray()
+    for record in records:
+        kind = record[0]
+        out.append(kind)
+        if kind == RESET:
+            pass
+        elif kind == SCENE:
+            name = record[1].encode("utf-8")
+            out += struct.pack(">H", len(name)) + name
+        elif kind == SEGMENT:
+            out += SEGMENT_FMT.pack(*record[1:])
+        elif kind == SEGMENT_TILES:
+            out += struct.pack(">HI", record[1], len(record[2])) + record[2]
+        elif kind == TOKEN:
+            out += TOKEN_FMT.pack(*record[1:])
+        elif kind == TOKEN_REMOVE:
+            out += struct.pack(">I", record[1])
+        elif kind == SEGMENT_REMOVE:
+            out += struct.pack(">H", record[1])
+        elif kind == EXPLORED:
+            out += EXPLORED_FMT.pack(record[1], record[2], len(record[3])) + record[3]
+        else:
+            raise ValueError(f"unknown record type {kind}")
+    return bytes(out)
+
+
+def decode_records(payload):
+    records = []
+    i = 0
+    while i < len(payload):
+        kind = payload[i]
+        i += 1
+        if kind == RESET:
+            records.append((RESET,))
+        elif kind == SCENE:
+            (size,) = struct.unpack_from(">H", payload, i)
+            records.append((SCENE, payload[i + 2:i + 2 + size].decode("utf-8")))
+            i += 2 + size
+        elif kind == SEGMENT:
+            records.append((SEGMENT,) + SEGMENT_FMT.unpack_from(payload, i))
+            i += SEGMENT_FMT.size
+        elif kind == SEGMENT_TILES:
+            seg_id, size = struct.unpack_from(">HI", payload, i)
+            records.append((SEGMENT_TILES, seg_id, payload[i + 6:i + 6 + size]))
+            i += 6 + size
+        elif kind == TOKEN:
+            records.append((TOKEN,) + TOKEN_FMT.unpack_from(payload, i))
+            i += TOKEN_FMT.size
+        elif kind == TOKEN_REMOVE:
+            records.append((TOKEN_REMOVE,) + struct.unpack_from(">I", payload, i))
+            i += 4
+        elif kind == SEGMENT_REMOVE:
+            records.append((SEGMENT_REMOVE,) + struct.unpack_from(">H", payload, i))
+            i += 2
+        elif kind == EXPLORED:
+            cx, cy, size = EXPLORED_FMT.unpack_from(payload, i)
+            start = i + EXPLORED_FMT.size
+            records.append((EXPLORED, cx, cy, payload[start:start + size]))
+            i = start + size
+        else:
+            raise ValueError(f"unknown record type {kind}")
+    return records
+
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def rle_decode(data):
+    # (count, byte) pairs, as written by ExploredMask.encode_chunk
+    out = bytearray()
+    for i in range(0, len(data), 2):
+        out += bytes((data[i + 1],)) * data[i]
+    return out
+
+
+# ------------------------------
+# Shared view state
+# ------------------------------
+class ViewState:
+    """Everything a remote player can see; kept by the server for snapshots
+    and by the client for rendering."""
+
+    def __init__(self):
+        self.scene = ""
+        self.segments = {}   # seg id -> [offset_x, offset_y, width, height, active]
+        self.tiles = {}      # seg id -> tile bytes
+        self.tokens = {}     # token id -> (x, y, is_player)
+        self.explored = {}   # (cx, cy) -> rle chunk bytes
+
+    def apply(self, records):
+        for record in records:
+            kind = record[0]
+            if kind == RESET:
+                self.__init__()
+            elif kind == SCENE:
+                self.scene = record[1]
+            elif kind == SEGMENT:
+                self.segments[record[1]] = list(record[2:])
+            elif kind == SEGMENT_TILES:
+                self.tiles[record[1]] = bytes(record[2])
+            elif kind == TOKEN:
+                self.tokens[record[1]] = record[2:]
+            elif kind == TOKEN_REMOVE:
+                self.tokens.pop(record[1], None)
+            elif kind == SEGMENT_REMOVE:
+                self.segments.pop(record[1], None)
+                self.tiles.pop(record[1], None)
+            elif kind == EXPLORED:
+                self.explored[(record[1], record[2])] = bytes(record[3])
+
+    def snapshot(self):
+        records = [(RESET,), (SCENE, self.scene)]
+        for seg_id, layout in self.segments.items():
+            records.append((SEGMENT, seg_id, *layout))
+        for seg_id, tiles in self.tiles.items():
+            records.append((SEGMENT_TILES, seg_id, tiles))
+        for token_id, (x, y, is_player) in self.tokens.items():
+            records.append((TOKEN, token_id, x, y, is_player))
+        for (cx, cy), data in self.explored.items():
+            records.append((EXPLORED, cx, cy, data))
+        return records
+
+
+# ------------------------------
+# Server
+# ------------------------------
+class BackgroundServer(abc.ABC):
+    """asyncio server running its own event loop on a daemon thread.
+
+    Subclasses provide handle_client, the per-connection coroutine.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.loop = None
+        self.server = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle_client, self.host, self.port))
+        # port=0 picks a free port; report the real one
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(timeout=2)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+
+    async def shutdown(self):
+        self.server.close()
+        tasks = [client.task for client in self.clients]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+
+    @abc.abstractmethod
+    async def handle_client(self, reader, writer):
+        """Serve one connection until it closes or the server shuts down."""
+
+
+class ViewClient:
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.resync = False
+        self.task = asyncio.current_task()
+
+
+class PlayerViewServer(BackgroundServer):
+    """asyncio server on a background thread.
+
+    publish() is called from the DM's frame loop and only hands records
+    to the server loop; encoding and socket writes happen over there.
+    A SEGMENT_TILES payload may be a function returning the bytes, so
+    the tile walk also runs on the server loop.
+    A client whose queue fills up is dropped back to a full snapshot
+    instead of ever blocking the publisher.
+    """
+
+    def __init__(self, host="0.0.0.0", port=DEFAULT_PORT):
+        super().__init__(host, port)
+        self.state = ViewState()
+
+    def publish(self, records):
+        if records and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.broadcast, records)
+
+    def broadcast(self, records):
+        records = [(SEGMENT_TILES, r[1], r[2]()) if r[0] == SEGMENT_TILES and callable(r[2]) else r
+                   for r in records]
+        self.state.apply(records)
+        if not self.clients:
+            return
+        data = frame(encode_records(records))
+        for client in self.clients:
+            if client.resync:
+                continue
+            try:
+                client.queue.put_nowait(data)
+            except asyncio.QueueFull:
+                # Too far behind: skip the backlog, send a fresh snapshot instead
+                client.resync = True
+                while not client.queue.empty():
+                    client.queue.get_nowait()
+                client.queue.put_nowait(None)
+
+    async def handle_client(self, reader, writer):
+        client = ViewClient(writer)
+        self.clients.add(client)
+        try:
+            writer.write(frame(encode_records(self.state.snapshot())))
+            await writer.drain()
+            while True:
+                data = await client.queue.get()
+                if data is None:
+                    client.resync = False
+                    data = frame(encode_records(self.state.snapshot()))
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass   # client went away, or the server is stopping
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+
+# ------------------------------
+# Rendered frame stream (HTTP)
+# ------------------------------
+def encode_png(width, height, rows):
+    """Minimal RGB PNG from a list of raw pixel rows."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    raw = b"".join(b"\x00" + row for row in rows)   # filter type 0 on every row
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 1))
+            + chunk(b"IEND", b""))
+
+
+STREAM_PAGE = b"""<!doctype html>
+<html><head><meta name="viewport" content="width=device-width">
+<style>body{margin:0;background:#000}canvas{width:100vw;height:100vh;object-fit:contain}</style>
+</head><body><canvas id="view"></canvas><script>
+const canvas = document.getElementById("view"), ctx = canvas.getContext("2d");
+async function run() {
+  const reader = (await fetch("/stream")).body.getReader();
+  let buf = new Uint8Array(0);
+  const need = async n => {
+    while (buf.length < n) {
+      const {value, done} = await reader.read();
+      if (done) throw new Error("closed");
+      const next = new Uint8Array(buf.length + value.length);
+      next.set(buf); next.set(value, buf.length); buf = next;
+    }
+  };
+  const take = n => { const out = buf.slice(0, n); buf = buf.slice(n); return out; };
+  for (;;) {
+    await need(6);
+    let head = new DataView(take(6).buffer);
+    const w = head.getUint16(0), h = head.getUint16(2), count = head.getUint16(4);
+    if (canvas.width != w || canvas.height != h) { canvas.width = w; canvas.height = h; }
+    for (let i = 0; i < count; i++) {
+      await need(8);
+      head = new DataView(take(8).buffer);
+      const x = head.getUint16(0), y = head.getUint16(2), size = head.getUint32(4);
+      await need(size);
+      const bitmap = await createImageBitmap(new Blob([take(size)], {type: "image/png"}));
+      ctx.drawImage(bitmap, x, y);
+    }
+  }
+}
+run().catch(() => setTimeout(() => location.reload(), 2000));
+</script></body></html>
+"""
+
+
+class StreamClient:
+    def __init__(self):
+        self.pending = {}            # (x, y) -> png, newest encoding of each tile not yet sent
+        self.ready = asyncio.Event()
+        self.task = asyncio.current_task()
+
+
+class FrameStreamServer(BackgroundServer):
+    """Serves the rendered player view to browsers as PNG tiles, re-encoding only changed ones."""
+
+    def __init__(self, host="0.0.0.0", port=STREAM_PORT, tile=STREAM_TILE):
+        super().__init__(host, port)
+        self.tile = tile
+        self.size = None
+        self.tiles = {}              # (x, y) -> png of the latest frame, for new clients
+        self.frame = None            # (data, size) waiting for the encoder
+        self.frame_ready = threading.Condition()
+        self.encoder = threading.Thread(target=self.encode_loop, daemon=True)
+
+    def start(self):
+        super().start()
+        self.encoder.start()
+        return self
+
+    def stop(self):
+        with self.frame_ready:
+            self.frame = False
+            self.frame_ready.notify()
+        super().stop()
+
+    def submit(self, data, size):
+        with self.frame_ready:
+            self.frame = (data, size)
+            self.frame_ready.notify()
+
+    # ---- encoder thread ----
+    def encode_loop(self):
+        previous = None
+        while True:
+            with self.frame_ready:
+                while self.frame is None:
+                    self.frame_ready.wait()
+                if self.frame is False:
+                    return
+                (data, size), self.frame = self.frame, None
+
+            if previous is None or previous[1] != size:
+                changed = self.encode_tiles(data, size, None)
+            else:
+                changed = self.encode_tiles(data, size, previous[0])
+            previous = (data, size)
+            if changed:
+                self.loop.call_soon_threadsafe(self.distribute, size, changed)
+
+    def encode_tiles(self, data, size, prev):
+        width, height = size
+        stride = width * 3
+        tile = self.tile
+        changed = {}
+        for y0 in range(0, height, tile):
+            y1 = min(y0 + tile, height)
+            rows = range(y0, y1)
+            # Whole-row compare first; most rows of a band are usually unchanged
+            if prev is not None:
+                dirty_rows = [y for y in rows if data[y * stride:(y + 1) * stride] != prev[y * stride:(y + 1) * stride]]
+                if not dirty_rows:
+                    continue
+            else:
+                dirty_rows = rows
+            for x0 in range(0, width, tile):
+                x1 = min(x0 + tile, width)
+                a, b = x0 * 3, x1 * 3
+                if prev is not None and all(data[y * stride + a:y * stride + b] == prev[y * stride + a:y * stride + b]
+                                            for y in dirty_rows):
+                    continue
+                tile_rows = [data[y * stride + a:y * stride + b] for y in rows]
+                changed[(x0, y0)] = encode_png(x1 - x0, y1 - y0, tile_rows)
+        return changed
+
+    # ---- server loop ----
+    def distribute(self, size, changed):
+        if size != self.size:
+            # Resized: the encoder sent every tile, drop the old ones
+            self.size = size
+            self.tiles = {}
+            for client in self.clients:
+                client.pending = {}
+        self.tiles.update(changed)
+        for client in self.clients:
+            client.pending.update(changed)
+            client.ready.set()
+
+    @staticmethod
+    def encode_update(size, tiles):
+        out = [struct.pack(">HHH", size[0], size[1], len(tiles))]
+        for (x, y), png in tiles.items():
+            out.append(struct.pack(">HHI", x, y, len(png)))
+            out.append(png)
+        return b"".join(out)
+
+    async def handle_client(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass   # headers are not needed
+            parts = request.split()
+            path = parts[1].decode("ascii", "replace") if len(parts) > 1 else "/"
+
+            if path == "/":
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                             b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(STREAM_PAGE) + STREAM_PAGE)
+                await writer.drain()
+                return
+            if path != "/stream":
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+                return
+
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                         b"Cache-Control: no-store\r\nConnection: close\r\n\r\n")
+            client = StreamClient()
+            client.pending = dict(self.tiles)   # full frame first
+            if client.pending:
+                client.ready.set()
+            self.clients.add(client)
+            try:
+                while True:
+                    await client.ready.wait()
+                    client.ready.clear()
+                    tiles, client.pending = client.pending, {}
+                    writer.write(self.encode_update(self.size, tiles))
+                    await writer.drain()   # a slow client waits here while its pending tiles are overwritten
+            finally:
+                self.clients.discard(client)
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+# ------------------------------
+# Reference client
+# ------------------------------
+def read_frames(sock):
+    """Yield decoded record lists from a connected socket until it closes."""
+    buf = bytearray()
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return
+        buf += data
+        while len(buf) >= FRAME_HEADER.size:
+            (size,) = FRAME_HEADER.unpack_from(buf)
+            if len(buf) < FRAME_HEADER.size + size:
+                break
+            payload = bytes(buf[FRAME_HEADER.size:FRAME_HEADER.size + size])
+            del buf[:FRAME_HEADER.size + size]
+            yield decode_records(payload)
+
+
+def run_client(host, port=DEFAULT_PORT, window=800):
+    import pygame
+
+    state = ViewState()
+    lock = threading.Lock()
+
+    def receive():
+        with socket.create_connection((host, port)) as sock:
+            for records in read_frames(sock):
+                with lock:
+                    state.apply(records)
+
+    threading.Thread(target=receive, daemon=True).start()
+
+    pygame.init()
+    screen = pygame.display.set_mode((window, window))
+    clock = pygame.time.Clock()
+    chunk = 32
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+
+        screen.fill((0, 0, 0))
+        with lock:
+            pygame.display.set_caption(f"Player View – {state.scene}")
+            active = {i: s for i, s in state.segments.items() if s[4] and i in state.tiles}
+            if active:
+                min_x = min(s[0] for s in active.values())
+                min_y = min(s[1] for s in active.values())
+                max_x = max(s[0] + s[2] for s in active.values())
+                max_y = max(s[1] + s[3] for s in active.values())
+                tile_px = max(1, window // max(max_x - min_x, max_y - min_y, 1))
+                explored = {key: rle_decode(data) for key, data in state.explored.items()}
+
+                def seen(x, y):
+                    bits = explored.get((x // chunk, y // chunk))
+                    if bits is None:
+                        return False
+                    bit = (y % chunk) * chunk + (x % chunk)
+                    return bool(bits[bit >> 3] & (1 << (bit & 7)))
+
+                # First segment wins where segments overlap, as on the DM side
+                for seg_id in sorted(active, reverse=True):
+                    ox, oy, w, h, _ = active[seg_id]
+                    tiles = state.tiles[seg_id]
+                    for ty in range(h):
+                        for tx in range(w):
+                            if not seen(ox + tx, oy + ty):
+                                continue
+                            value = tiles[ty * w + tx]
+                            colour = (255, 255, 255) if value & TILE_WALKABLE else (50, 50, 50)
+                            rect = pygame.Rect((ox + tx - min_x) * tile_px, (oy + ty - min_y) * tile_px,
+                                               tile_px, tile_px)
+                            pygame.draw.rect(screen, colour, rect)
+
+                for x, y, is_player in state.tokens.values():
+                    centre = ((x - min_x) * tile_px + tile_px // 2, (y - min_y) * tile_px + tile_px // 2)
+                    pygame.draw.circle(screen, (0, 0, 255) if is_player else (200, 0, 0),
+                                       centre, max(2, tile_px // 3))
+
+        pygame.display.flip()
+        clock.tick(20)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python netview.py <host> [port]")
+        sys.exit(1)
+    run_client(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT)